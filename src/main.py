@@ -1,14 +1,77 @@
+from __future__ import annotations
+
 import asyncio
+import base64
 import click
-from bleak import BleakClient, BleakScanner
-from bleak.exc import BleakDBusError, BleakDeviceNotFoundError
-from PIL import Image, ImageDraw, ImageFont, ImageOps
+import collections
+import concurrent.futures
+import contextlib
+import contextvars
+import functools
+import hashlib
+import io
+import ipaddress
+import json
+import mmap
+import os
+import platform
+import random
 import logging
+import math
+import subprocess
 import sys
-import numpy as np
 import re
+import struct
+import threading
 import time
 
+class LazyModule:
+    """Stands in for a heavy module until it is first used, so each command only
+    pays for importing what it touches. The loader imports with a plain import
+    statement, which keeps the module visible to freezers such as PyInstaller.
+    On first use the real module replaces the stand-in in this module's globals."""
+
+    def __init__(self, load):
+        self._load = load
+        self._module = None
+
+    def __getattr__(self, name):
+        if self._module is None:
+            self._module = self._load()
+            globals()[self._load.__name__] = self._module
+        return getattr(self._module, name)
+
+@LazyModule
+def np():
+    import numpy
+    return numpy
+
+@LazyModule
+def Image():
+    from PIL import Image
+    return Image
+
+@LazyModule
+def ImageDraw():
+    from PIL import ImageDraw
+    return ImageDraw
+
+@LazyModule
+def ImageFont():
+    from PIL import ImageFont
+    return ImageFont
+
+@LazyModule
+def ImageOps():
+    from PIL import ImageOps
+    return ImageOps
+
+@LazyModule
+def bleak():
+    import bleak
+    import bleak.exc
+    return bleak
+
 # Constants
 SERVICE_UUID = "62750001-d828-918d-fb46-b6c11c675aec"
 CHARACTERISTIC_UUID = "62750002-d828-918d-fb46-b6c11c675aec"
@@ -19,8 +82,28 @@ DRIVER_TO_RESOLUTION = {
 }
 
 # Palettes
-THREE_COLOR_PALETTE = np.array([[0, 0, 0], [255, 255, 255], [255, 0, 0]])
-TWO_COLOR_PALETTE = np.array([[0, 0, 0], [255, 255, 255]])
+THREE_COLOR_PALETTE = ((0, 0, 0), (255, 255, 255), (255, 0, 0))
+TWO_COLOR_PALETTE = ((0, 0, 0), (255, 255, 255))
+
+CACHE_DIR = os.path.join(os.environ.get('XDG_CACHE_HOME') or os.path.expanduser('~/.cache'), 'epd-ble-sender')
+FRAME_CACHE_MAX_BYTES = 256 * 1024 * 1024
+FRAME_CACHE_MEMORY_BYTES = 32 * 1024 * 1024 # Frames a long-running process keeps in memory
+HANDSHAKE_TIMEOUT = 10.0
+PROFILE_HANDSHAKE_TIMEOUT = 1.0 # Grace period for config/MTU when a stored profile exists
+DEFAULT_SOCKET_PATH = os.path.join(os.environ.get('XDG_RUNTIME_DIR') or CACHE_DIR, 'epd-ble-sender.sock')
+JOB_LINE_LIMIT = 1024 * 1024 # Longest job line; a base64 800x480 bwr frame is about 128 KB
+DEFAULT_FONT = '/usr/share/fonts/truetype/dejavu/DejaVuSans.ttf'
+STATIC_ACK_DELAY = 0.05 # Pause after each acknowledged chunk in static flow control
+RETRY_BASE_DELAY = 2.0
+RETRY_MAX_DELAY = 60.0
+ADAPTIVE_MAX_WINDOW = 64
+SCAN_TIMEOUT = 5.0
+DECODE_REDUCING_GAP = 2.0 # Source images are decoded at no more than this multiple of the size they are resized to
+REDUCIBLE_MODES = ('L', 'LA', 'RGB', 'RGBA', 'CMYK', 'I', 'F') # Modes Image.reduce() accepts
+STREAM_BAND_ROWS = 16 # Rows dithered between hand-offs to a streaming transfer
+FONT_CACHE_SIZE = 32
+GLYPH_CACHE_SIZE = 512 # Rasterised lines of text kept per process
+TEMPLATE_CACHE_SIZE = 16
 
 class EpdCmd:
     INIT = 0x01; CLEAR = 0x02; REFRESH = 0x05; WRITE_IMG = 0x30;
@@ -29,89 +112,377 @@ class EpdCmd:
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s', stream=sys.stdout)
 logger = logging.getLogger(__name__)
 
+# Set per task when several devices are handled at once, so their log lines stay apart.
+current_device = contextvars.ContextVar('current_device', default=None)
+
+class DeviceLogFilter(logging.Filter):
+    def filter(self, record):
+        device = current_device.get()
+        if device: record.msg = f"[{device}] {record.msg}"
+        return True
+
+logger.addFilter(DeviceLogFilter())
+
+# --- Metrics ---
+
+class RunMetrics:
+    """Timing spans and counters for one device run.
+
+    Phases do not nest (dither and pack are not part of decode or resize). The
+    image phases run in a worker thread and may overlap connect, handshake and
+    transfer, so the phase seconds can add up to more than the device's total
+    time; the other phases never overlap.
+    """
+    def __init__(self, address=None, adapter=None):
+        self.address = address
+        self.adapter = adapter
+        self.phases = collections.defaultdict(lambda: [0.0, 0])
+        self.counters = collections.Counter()
+        self.ok = None
+        self.seconds = 0.0
+
+    @contextlib.contextmanager
+    def span(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            phase = self.phases[name]
+            phase[0] += time.perf_counter() - start
+            phase[1] += 1
+
+    def to_dict(self):
+        transfer_seconds = self.phases['transfer'][0] if 'transfer' in self.phases else 0.0
+        return {
+            'address': self.address, 'adapter': self.adapter, 'ok': self.ok, 'seconds': round(self.seconds, 6),
+            'phases': {name: {'seconds': round(seconds, 6), 'count': count} for name, (seconds, count) in self.phases.items()},
+            'counters': dict(self.counters),
+            'bytes_per_second': round(self.counters['bytes'] / transfer_seconds, 1) if transfer_seconds else None,
+            'peak_rss_bytes': peak_rss_bytes(),
+        }
+
+def peak_rss_bytes():
+    """The most resident memory this process has used so far, or None where the platform does not report it."""
+    try:
+        import resource
+    except ImportError: # Windows
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak if sys.platform == 'darwin' else peak * 1024 # macOS reports bytes, Linux kibibytes
+
+# Set per task like current_device; code deep in the pipeline records into it without extra arguments.
+current_metrics = contextvars.ContextVar('current_metrics', default=None)
+
+def span(name):
+    """Times a phase into the current RunMetrics, or does nothing outside a run."""
+    metrics = current_metrics.get()
+    return metrics.span(name) if metrics else contextlib.nullcontext()
+
+def count(name, amount=1):
+    metrics = current_metrics.get()
+    if metrics: metrics.counters[name] += amount
+
+def write_atomic(path, text):
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, 'w') as f:
+        f.write(text)
+    os.replace(tmp_path, path)
+
+def prometheus_label(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+def metrics_to_prometheus(runs, command):
+    """Formats runs for the node_exporter textfile collector; every sample describes the last run."""
+    lines = []
+    def family(name, help_text, samples):
+        lines.append(f"# HELP epd_sender_{name} {help_text}")
+        lines.append(f"# TYPE epd_sender_{name} gauge")
+        for labels, value in samples:
+            label_text = ','.join(f'{key}="{prometheus_label(val)}"' for key, val in labels.items())
+            lines.append(f"epd_sender_{name}{{{label_text}}} {value}")
+
+    def device(run, **extra):
+        return {'command': command, 'address': run.address, 'adapter': run.adapter or 'default', **extra}
+
+    family('last_run_timestamp_seconds', 'Unix time the last run finished.',
+           [({'command': command}, f"{time.time():.3f}")])
+    family('last_run_success', 'Whether the last run on the device succeeded.',
+           [(device(run), int(bool(run.ok))) for run in runs])
+    family('last_run_seconds', 'Wall time of the last run on the device.',
+           [(device(run), f"{run.seconds:.6f}") for run in runs])
+    family('last_run_phase_seconds', 'Time spent per phase in the last run.',
+           [(device(run, phase=name), f"{seconds:.6f}") for run in runs for name, (seconds, _) in sorted(run.phases.items())])
+    family('last_run_events', 'Chunks, acknowledged writes, retries and bytes counted in the last run.',
+           [(device(run, event=name), value) for run in runs for name, value in sorted(run.counters.items())])
+    peak = peak_rss_bytes()
+    if peak is not None:
+        family('last_run_peak_rss_bytes', 'Peak resident memory of the sender process during the last run.',
+               [({'command': command}, peak)])
+    return '\n'.join(lines) + '\n'
+
+def export_metrics(runs, command, json_path=None, prom_path=None):
+    """Writes the per-device metrics of a finished run; files are replaced atomically."""
+    try:
+        if json_path:
+            report = {'command': command, 'timestamp': time.time(), 'devices': [run.to_dict() for run in runs]}
+            write_atomic(json_path, json.dumps(report, indent=2) + '\n')
+        if prom_path:
+            write_atomic(prom_path, metrics_to_prometheus(runs, command))
+    except OSError as e:
+        logger.error(f"Could not write metrics: {e}")
+
 # --- Dithering Algorithms ---
 
+@functools.lru_cache(maxsize=None)
+def color_palette(color_mode):
+    """The palette for a colour mode as an array."""
+    return np.array(THREE_COLOR_PALETTE if color_mode == 'bwr' else TWO_COLOR_PALETTE)
+
 def find_closest_color(pixel, palette):
-    return palette[np.argmin(np.sqrt(np.sum((palette - pixel)**2, axis=1)))]
+    """Nearest palette entry for a single pixel or any array of pixels shaped (..., 3)."""
+    return palette[np.argmin(np.sqrt(np.sum((palette - pixel[..., None, :])**2, axis=-1)), axis=-1)]
 
-def dither(image: Image.Image, palette: np.ndarray, algorithm: str):
+ERROR_DIFFUSION_MATRICES = {
+    'floyd': ([[0, 0, 7], [3, 5, 1]], 16),
+    'jarvis': ([[0,0,0,7,5],[3,5,7,5,3],[1,3,5,3,1]], 48),
+    'stucki': ([[0,0,0,8,4],[2,4,8,4,2],[1,2,4,2,1]], 42),
+    'atkinson': ([[0,0,1,1],[1,1,1,0],[0,1,0,0]], 8)
+}
+
+def dither(image: Image.Image, palette: np.ndarray, algorithm: str, on_rows=None):
+    """Error-diffusion dithering, processed as a wavefront over a skewed buffer.
+
+    Pixel (y, x) is stored at column x + skew * y, where skew is the kernel
+    width minus one. Every pixel in one column of the skewed buffer has all of
+    its error contributions already applied, so a whole column is quantized
+    at once and each kernel tap becomes a fixed (row, column) slice offset.
+    Taps are applied bottom row first, which keeps the order of the float
+    additions identical to a plain raster scan, so the output matches the
+    per-pixel reference exactly.
+
+    Row y is final once column width - 1 + skew * y has been quantized, so
+    on_rows, if given, receives finished uint8 rows in order while the rest
+    of the image is still being dithered.
+    """
+    palette = np.asarray(palette)
     img_array = np.array(image.convert('RGB'), dtype=np.float32)
     height, width, _ = img_array.shape
 
-    matrices = {
-        'floyd': ([[0, 0, 7], [3, 5, 1]], 16),
-        'jarvis': ([[0,0,0,7,5],[3,5,7,5,3],[1,3,5,3,1]], 48),
-        'stucki': ([[0,0,0,8,4],[2,4,8,4,2],[1,2,4,2,1]], 42),
-        'atkinson': ([[0,0,1,1],[1,1,1,0],[0,1,0,0]], 8)
-    }
-    
-    matrix, divisor = matrices[algorithm]
+    matrix, divisor = ERROR_DIFFUSION_MATRICES[algorithm]
     matrix_h, matrix_w = len(matrix), len(matrix[0])
     center_x = matrix_w // 2
+    skew = matrix_w - 1
+    taps = [(my, mx - center_x + skew * my, matrix[my][mx])
+            for my in reversed(range(matrix_h)) for mx in range(matrix_w) if matrix[my][mx]]
+    weights = sorted({weight for _, _, weight in taps})
 
+    # Stored column-major so each wavefront is contiguous. Padding absorbs
+    # contributions that fall outside the image; those cells are never read back.
+    left = center_x
+    buf = np.zeros((left + width + skew * (height + matrix_h) + matrix_w, height + matrix_h, 3), dtype=np.float32)
     for y in range(height):
-        for x in range(width):
-            old_pixel = img_array[y, x].copy()
-            new_pixel = find_closest_color(old_pixel, palette)
-            img_array[y, x] = new_pixel
-            quant_error = old_pixel - new_pixel
-
-            for my in range(matrix_h):
-                for mx in range(matrix_w):
-                    if matrix[my][mx] == 0: continue
-                    px, py = x + mx - center_x, y + my
-                    if 0 <= px < width and 0 <= py < height:
-                        img_array[py, px] += quant_error * matrix[my][mx] / divisor
-    
+        buf[left + skew * y:left + skew * y + width, y] = img_array[y]
+
+    def finished_rows(start, stop):
+        for y in range(start, stop):
+            img_array[y] = buf[left + skew * y:left + skew * y + width, y]
+        return np.clip(img_array[start:stop], 0, 255).astype(np.uint8)
+
+    emitted = 0
+    for t in range(width + skew * (height - 1)):
+        y0 = max(0, (t - width) // skew + 1)
+        y1 = min(height, t // skew + 1)
+        col = left + t
+        old_pixels = buf[col, y0:y1].copy()
+        new_pixels = find_closest_color(old_pixels, palette)
+        buf[col, y0:y1] = new_pixels
+        quant_error = old_pixels - new_pixels
+        spread = {weight: quant_error * weight / divisor for weight in weights}
+        for my, offset, weight in taps:
+            buf[col + offset, y0 + my:y1 + my] += spread[weight]
+        if on_rows and y0 - emitted >= STREAM_BAND_ROWS: # Rows above y0 are complete
+            on_rows(finished_rows(emitted, y0))
+            emitted = y0
+
+    rows = finished_rows(emitted, height)
+    if on_rows: on_rows(rows)
     return Image.fromarray(np.clip(img_array, 0, 255).astype(np.uint8))
 
-def bayer_dither(image: Image.Image, palette: np.ndarray):
-    bayer_matrix = np.array([
-        [ 0, 32,  8, 40,  2, 34, 10, 42], [48, 16, 56, 24, 50, 18, 58, 26],
-        [12, 44,  4, 36, 14, 46,  6, 38], [60, 28, 52, 20, 62, 30, 54, 22],
-        [ 3, 35, 11, 43,  1, 33,  9, 41], [51, 19, 59, 27, 49, 17, 57, 25],
-        [15, 47,  7, 39, 13, 45,  5, 37], [63, 31, 55, 23, 61, 29, 53, 21]])
-    
+def bayer_matrix(size):
+    """Recursive Bayer index matrix; size must be a power of two."""
+    matrix = np.zeros((1, 1), dtype=np.int64)
+    while matrix.shape[0] < size:
+        matrix = np.block([[4 * matrix, 4 * matrix + 2], [4 * matrix + 3, 4 * matrix + 1]])
+    return matrix
+
+@functools.lru_cache(maxsize=None)
+def blue_noise_matrix(size=64, sigma=1.5):
+    """Blue-noise threshold matrix, loaded from the cache directory.
+
+    Generating it takes longer than dithering a frame with it, so the map
+    is generated once and saved; later processes only load it.
+    """
+    path = os.path.join(CACHE_DIR, f"bluenoise-{size}-{sigma}.npy")
+    try:
+        matrix = np.load(path)
+        if matrix.shape == (size, size):
+            return matrix
+    except (OSError, ValueError):
+        pass
+    matrix = generate_blue_noise_matrix(size, sigma)
+    try:
+        os.makedirs(CACHE_DIR, exist_ok=True)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, 'wb') as f:
+            np.save(f, matrix)
+        os.replace(tmp_path, path)
+    except OSError as e:
+        logger.warning(f"Could not cache the blue-noise map: {e}")
+    return matrix
+
+def generate_blue_noise_matrix(size=64, sigma=1.5):
+    """Void-and-cluster threshold matrix (Ulichney).
+
+    The seed is fixed so the same map, and therefore the same output, is
+    produced on every run.
+    """
+    coords = np.minimum(np.arange(size), size - np.arange(size))
+    kernel = np.exp(-(coords[:, None]**2 + coords[None, :]**2) / (2 * sigma**2))
+
+    def toggle(pattern, energy, index, value):
+        pattern[index] = value
+        energy += (1 if value else -1) * np.roll(kernel, divmod(index, size), axis=(0, 1)).ravel()
+
+    def tightest_cluster(pattern, energy):
+        return int(np.argmax(np.where(pattern, energy, -np.inf)))
+
+    def largest_void(pattern, energy):
+        return int(np.argmin(np.where(pattern, np.inf, energy)))
+
+    rng = np.random.default_rng(0)
+    pattern = np.zeros(size * size, dtype=bool)
+    energy = np.zeros(size * size)
+    for index in rng.choice(size * size, size * size // 10, replace=False):
+        toggle(pattern, energy, index, True)
+
+    # Move points from the tightest cluster into the largest void until stable.
+    for _ in range(size * size):
+        cluster = tightest_cluster(pattern, energy)
+        toggle(pattern, energy, cluster, False)
+        void = largest_void(pattern, energy)
+        toggle(pattern, energy, void, True)
+        if void == cluster: break
+
+    ranks = np.zeros(size * size, dtype=np.int64)
+    prototype, prototype_energy = pattern.copy(), energy.copy()
+    ones = int(pattern.sum())
+    for rank in range(ones - 1, -1, -1):
+        cluster = tightest_cluster(pattern, energy)
+        toggle(pattern, energy, cluster, False)
+        ranks[cluster] = rank
+    pattern, energy = prototype, prototype_energy
+    for rank in range(ones, size * size):
+        void = largest_void(pattern, energy)
+        toggle(pattern, energy, void, True)
+        ranks[void] = rank
+    return ranks.reshape(size, size)
+
+ORDERED_DITHER_MATRICES = {
+    'bayer': lambda: bayer_matrix(8),
+    'bayer2': lambda: bayer_matrix(2),
+    'bayer4': lambda: bayer_matrix(4),
+    'bayer8': lambda: bayer_matrix(8),
+    'bayer16': lambda: bayer_matrix(16),
+    'bluenoise': blue_noise_matrix,
+}
+
+def ordered_dither(image: Image.Image, palette: np.ndarray, threshold_matrix: np.ndarray, row_offset=0):
+    """Tiles the threshold matrix over the frame and quantizes every pixel in one pass.
+
+    row_offset is the frame row of the image's first row, so a band of rows
+    dithers exactly as it would as part of the whole frame.
+    """
+    palette = np.asarray(palette)
     img_array = np.array(image.convert('RGB'), dtype=np.float32)
     height, width, _ = img_array.shape
-    
-    for y in range(height):
-        for x in range(width):
-            threshold = (bayer_matrix[y % 8, x % 8] / 64.0 - 0.5) * 50
-            pixel = np.clip(img_array[y, x] + threshold, 0, 255)
-            img_array[y, x] = find_closest_color(pixel, palette)
-            
-    return Image.fromarray(img_array.astype(np.uint8))
+    threshold_matrix = np.roll(threshold_matrix, -row_offset, axis=0)
+    matrix_h, matrix_w = threshold_matrix.shape
+
+    tiled = np.tile(threshold_matrix, (-(-height // matrix_h), -(-width // matrix_w)))[:height, :width]
+    threshold = (tiled / float(threshold_matrix.size) - 0.5) * 50
+    pixels = np.clip(img_array + threshold[..., None], 0, 255)
+    return Image.fromarray(find_closest_color(pixels, palette).astype(np.uint8))
+
+def bayer_dither(image: Image.Image, palette: np.ndarray, size=8):
+    return ordered_dither(image, palette, bayer_matrix(size))
+
+def apply_dither(image: Image.Image, palette: np.ndarray, algorithm: str, on_rows=None):
+    """Dithers with any algorithm; on_rows receives the finished uint8 rows, in bands where the algorithm allows."""
+    with span('dither'):
+        if algorithm in ORDERED_DITHER_MATRICES:
+            image = ordered_dither(image, palette, ORDERED_DITHER_MATRICES[algorithm]())
+            if on_rows: on_rows(np.asarray(image.convert('RGB')))
+            return image
+        return dither(image, palette, algorithm, on_rows)
 
 # --- Image to Buffer Conversion ---
 
+def pack_plane(mask: np.ndarray):
+    """Packs a (height, width) boolean mask MSB-first, padding each row to a whole byte."""
+    return np.packbits(mask, axis=1).tobytes()
+
+def uniform_plane_value(plane, width):
+    """Returns True or False if every pixel of a packed plane has that bit, otherwise None.
+    Row padding is ignored, since packing leaves it clear."""
+    rows = np.frombuffer(plane, dtype=np.uint8).reshape(-1, (width + 7) // 8)
+    for value in (True, False):
+        if np.array_equal(rows, np.broadcast_to(np.frombuffer(pack_plane(np.full((1, width), value)), dtype=np.uint8), rows.shape)):
+            return value
+    return None
+
+def pixels_to_planes(pixels: np.ndarray, color_mode='bw'):
+    """Packs RGB pixels shaped (rows, width, 3) into planes. Rows are packed
+    independently, so the planes of consecutive bands concatenate."""
+    if color_mode == 'bwr':
+        is_black = np.all(pixels < 128, axis=2)
+        is_white = np.all(pixels > 128, axis=2)
+        return pack_plane(~is_black), pack_plane(is_black | is_white)
+    return (pack_plane(pixels[:, :, 0] > 128),)
+
+def image_to_planes(image: Image.Image, color_mode='bw'):
+    """Converts a palette image to EPD planes without touching BLE.
+
+    Returns (black,) for 'bw' and (black, red) for 'bwr'. A set bit in the
+    black plane means "not black"; a set bit in the red plane means "not red".
+    """
+    with span('pack'):
+        return pixels_to_planes(np.asarray(image.convert('RGB')), color_mode)
+
+def split_planes(epd_data: bytes, color_mode='bw'):
+    """Inverse of joining the planes from image_to_planes()."""
+    if color_mode == 'bwr':
+        half_len = len(epd_data) // 2
+        return epd_data[:half_len], epd_data[half_len:]
+    return (epd_data,)
+
+def planes_to_image(planes, width, height):
+    """Inverse of image_to_planes(): renders packed planes back to an RGB palette image."""
+    def unpack(plane):
+        return np.unpackbits(np.frombuffer(plane, dtype=np.uint8).reshape(height, -1), axis=1)[:, :width].astype(bool)
+
+    not_black = unpack(planes[0])
+    pixels = np.zeros((height, width, 3), dtype=np.uint8)
+    pixels[not_black] = (255, 255, 255)
+    if len(planes) > 1:
+        pixels[not_black & ~unpack(planes[1])] = (255, 0, 0)
+    return Image.fromarray(pixels)
+
 def image_to_bw_data(image: Image.Image):
-    byte_width = (image.width + 7) // 8
-    buffer = bytearray(byte_width * image.height)
-    for y in range(image.height):
-        for x in range(image.width):
-            r, _, _ = image.getpixel((x, y))
-            if r > 128: buffer[y * byte_width + x // 8] |= (1 << (7 - (x % 8)))
-    return bytes(buffer)
+    return image_to_planes(image, 'bw')[0]
 
 def image_to_bwr_data(image: Image.Image):
-    width, height = image.width, image.height
-    byte_width = (width + 7) // 8
-    b_buffer = bytearray(height * byte_width)
-    r_buffer = bytearray(height * byte_width)
-    for y in range(height):
-        for x in range(width):
-            r, g, b = image.getpixel((x, y))
-            byte_index = y * byte_width + x // 8
-            bit_index = 7 - (x % 8)
-            if r < 128 and g < 128 and b < 128: # Black
-                r_buffer[byte_index] |= (1 << bit_index)
-            elif r > 128 and g > 128 and b > 128: # White
-                b_buffer[byte_index] |= (1 << bit_index)
-                r_buffer[byte_index] |= (1 << bit_index)
-            else: # Red
-                b_buffer[byte_index] |= (1 << bit_index)
-    return bytes(b_buffer) + bytes(r_buffer)
+    b_plane, r_plane = image_to_planes(image, 'bwr')
+    return b_plane + r_plane
 
 # --- BLE Communication ---
 
@@ -120,35 +491,635 @@ async def send_command(client, cmd, data=None, with_response=True):
     if data: payload.extend(data)
     await client.write_gatt_char(CHARACTERISTIC_UUID, payload, response=with_response)
 
-async def write_image_data(client, image_data, mtu_size, interleaved_count, step='bw'):
-    logger.info(f"Writing image data (step: {step}) with MTU size: {mtu_size}, interleaved count: {interleaved_count}")
+class AdaptiveWindow:
+    """AIMD control of how many chunks are written before asking for a response.
+
+    Each acknowledged write measures its round trip per chunk in the burst.
+    The baseline is the minimum of the last BASELINE_SAMPLES measurements,
+    floored at RTT_FLOOR, so one unusually fast ack does not become a
+    permanent target. While the round trip stays close to the baseline, the
+    window grows by one chunk and no pause is taken; when it climbs well
+    above it, the window is halved and the sender pauses briefly so the link
+    can drain. A window already at one chunk is left alone without pausing.
+    The window persists across planes (and across frames on a warm connection).
+    """
+    GROW_BELOW = 1.5
+    SHRINK_ABOVE = 2.5
+    BASELINE_SAMPLES = 16
+    RTT_FLOOR = 0.001 # Per-chunk round trips below this are timer noise, not a faster link
+
+    def __init__(self, initial, maximum=ADAPTIVE_MAX_WINDOW):
+        self.maximum = maximum
+        self.size = min(max(1, initial), maximum)
+        self.samples = collections.deque(maxlen=self.BASELINE_SAMPLES)
+
+    @property
+    def best(self):
+        return min(self.samples) if self.samples else None
+
+    def on_ack(self, rtt, burst):
+        """Updates the window from one acknowledged burst; returns the pause to take in seconds."""
+        per_chunk = max(rtt / burst, self.RTT_FLOOR)
+        self.samples.append(per_chunk)
+        if per_chunk <= self.best * self.GROW_BELOW:
+            self.size = min(self.maximum, self.size + 1)
+        elif per_chunk > self.best * self.SHRINK_ABOVE and self.size > 1:
+            self.size //= 2
+            return STATIC_ACK_DELAY
+        return 0
+
+class PlaneStream:
+    """A plane that a worker thread is still packing. It can be sent while it fills:
+    write_image_data waits for the bytes each chunk needs."""
+
+    def __init__(self, size):
+        self.size = size
+        self.data = bytearray()
+        self._loop = asyncio.get_running_loop()
+        self._changed = asyncio.Event()
+        self._error = None
+
+    def __len__(self):
+        return self.size
+
+    def __getitem__(self, key):
+        return self.data[key]
+
+    def feed(self, data):
+        """Appends packed rows; safe to call from any thread."""
+        self._loop.call_soon_threadsafe(self._update, bytes(data), None)
+
+    def fail(self, error):
+        self._loop.call_soon_threadsafe(self._update, b'', error)
+
+    def _update(self, data, error):
+        self.data += data
+        self._error = self._error or error
+        self._changed.set()
+
+    async def wait_for(self, size):
+        while len(self.data) < min(size, self.size):
+            if self._error: raise self._error
+            self._changed.clear()
+            await self._changed.wait()
+
+async def write_image_data(client, image_data, mtu_size, interleaved_count, step='bw', window=None, checkpoint=None):
+    """Writes one plane in MTU-sized chunks.
+
+    Without a window, a response is requested every interleaved_count chunks
+    followed by a fixed pause. With an AdaptiveWindow, the burst length
+    follows the measured acknowledgement round trip instead. A
+    TransferCheckpoint records how far the device has acknowledged, and the
+    plane continues from there if the checkpoint already has progress for it.
+    image_data may be a PlaneStream that is still being filled.
+    """
+    mode = f"adaptive window: {window.size}" if window else f"interleaved count: {interleaved_count}"
+    logger.info(f"Writing image data (step: {step}) with MTU size: {mtu_size}, {mode}")
     chunk_size = mtu_size - 2
     if chunk_size <= 0: return
     no_reply_count = interleaved_count
-    total_chunks = (len(image_data) + chunk_size - 1) // chunk_size
-    for i in range(0, len(image_data), chunk_size):
+    unacked = 0
+    offset = checkpoint.acked.get(step, 0) if checkpoint else 0
+    if offset: logger.info(f"Continuing plane {step} after {offset} acknowledged bytes")
+    total_chunks = (len(image_data) - offset + chunk_size - 1) // chunk_size
+    start = time.monotonic()
+    for i in range(offset, len(image_data), chunk_size):
+        if isinstance(image_data, PlaneStream): await image_data.wait_for(i + chunk_size)
         chunk = image_data[i:i + chunk_size]
         header = (0x0F if step == 'bw' else 0x00) | (0x00 if i == 0 else 0xF0)
         data_payload = bytearray([header])
         data_payload.extend(chunk)
         
         is_last_chunk = (i + chunk_size) >= len(image_data)
-        with_response = (no_reply_count <= 1 and interleaved_count > 0) or is_last_chunk
+        if window:
+            with_response = unacked + 1 >= window.size or is_last_chunk
+        else:
+            with_response = (no_reply_count <= 1 and interleaved_count > 0) or is_last_chunk
 
-        logger.info(f"⇑ Sending chunk {i // chunk_size + 1}/{total_chunks} (header: {header:02x}, with_response={with_response})")
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug(f"⇑ Sending chunk {(i - offset) // chunk_size + 1}/{total_chunks} (header: {header:02x}, with_response={with_response})")
+        sent_at = time.monotonic()
         await send_command(client, EpdCmd.WRITE_IMG, data_payload, with_response=with_response)
-        
+        count('chunks')
         if with_response:
+            count('acked_writes')
+            # Writes arrive in order, so an acknowledged chunk means everything before it arrived too.
+            if checkpoint: checkpoint.acked[step] = i + len(chunk)
+        
+        if window:
+            if with_response:
+                pause = window.on_ack(time.monotonic() - sent_at, unacked + 1)
+                unacked = 0
+                if pause: await asyncio.sleep(pause)
+            else:
+                unacked += 1
+        elif with_response:
             no_reply_count = interleaved_count
-            await asyncio.sleep(0.05)
+            await asyncio.sleep(STATIC_ACK_DELAY)
         else:
             no_reply_count -= 1
 
-# --- Main Logic ---
+    sent = len(image_data) - offset
+    count('bytes', sent)
+    elapsed = time.monotonic() - start
+    rate = sent / elapsed if elapsed > 0 else float('inf')
+    logger.info(f"Sent {sent} bytes in {total_chunks} chunks, {elapsed:.2f}s ({rate:.0f} B/s{f', window {window.size}' if window else ''})")
+
+def connection_errors():
+    """Errors after which reconnecting may help."""
+    return (bleak.exc.BleakDBusError, asyncio.TimeoutError, bleak.exc.BleakDeviceNotFoundError, EOFError)
+
+def backoff_delay(retry_index, base=RETRY_BASE_DELAY, cap=RETRY_MAX_DELAY):
+    """Seconds to wait before retry number retry_index (0 for the first).
+
+    Doubles from base up to cap, with equal jitter: a random half of the
+    delay is added to the other half, so devices that dropped together do
+    not reconnect in lockstep.
+    """
+    delay = min(cap, base * 2 ** retry_index)
+    return delay / 2 + random.uniform(0, delay / 2)
+
+class TransferCheckpoint:
+    """How far the device has acknowledged each plane of one frame, kept across reconnects.
+
+    Writes arrive in order, so an acknowledged chunk means everything before
+    it arrived; writes sent after the last acknowledgement are taken to have
+    been lost with the link. resolution and mtu_size are those of the
+    connection the progress was made on, so a reconnect can continue without
+    a new handshake.
+    """
+
+    def __init__(self):
+        self.frame = None
+        self.acked = {}
+        self.resolution = None
+        self.mtu_size = 0
+
+    def use_for(self, frame):
+        """Keeps the progress if it belongs to this frame (any key that identifies it), otherwise starts over."""
+        if frame != self.frame:
+            self.frame, self.acked = frame, {}
+
+    @property
+    def resumable(self):
+        return bool(self.acked) and self.mtu_size > 0
+
+class DeviceSession:
+    """One BLE connection to a display, plus what its config/MTU handshake reported.
+
+    With profiles given, the handshake falls back to (and refreshes) the
+    stored profile for the address; use_profile=False still records what
+    the device reports but always waits for the full handshake.
+    """
+
+    client_class = None # BleakClient; replaced by a SimulatedClient factory under --simulate
+
+    def __init__(self, address, adapter=None, profiles=None, use_profile=True):
+        self.address = address
+        self.adapter = adapter
+        self.profiles = profiles
+        self.profile = profiles.get(address) if profiles and use_profile else None
+        self.client = None
+        self.driver = self.resolution = None
+        self.mtu_size = 0
+        self.window = None # AdaptiveWindow, kept for the life of the connection
+        self._notifying = False
+        self._msg_index = 0
+        self._config_event = self._mtu_event = None
+
+    @property
+    def is_connected(self):
+        return self.client is not None and self.client.is_connected
+
+    async def connect(self):
+        self.client = (self.client_class or bleak.BleakClient)(self.address, adapter=self.adapter)
+        await self.client.connect()
+
+    async def close(self):
+        if not self.is_connected: return
+        if self._notifying:
+            await self.client.stop_notify(CHARACTERISTIC_UUID)
+            self._notifying = False
+        await self.client.disconnect()
+        logger.info("Disconnected.")
+
+    def _notification_handler(self, sender, data):
+        if self._msg_index == 0:
+            logger.info(f"⇓ Received config: {data.hex()}")
+            if len(data) >= 12:
+                config = {'model_id': data[7]}
+                driver_byte = self.driver = config['model_id']
+                resolution = DRIVER_TO_RESOLUTION.get(driver_byte)
+                if resolution:
+                    self.resolution = resolution
+                    logger.info(f"Detected driver 0x{driver_byte:02x}, setting resolution to {resolution}")
+                else: logger.warning(f"Unknown driver 0x{driver_byte:02x}")
+            self._config_event.set()
+        else:
+            try:
+                if data.decode('utf-8').startswith('mtu='):
+                    self.mtu_size = int(data.decode('utf-8').split('=')[1])
+                    logger.info(f"MTU updated to: {self.mtu_size}")
+                    if not self._mtu_event.is_set(): self._mtu_event.set()
+            except (UnicodeDecodeError, IndexError): pass
+        self._msg_index += 1
+
+    async def handshake(self):
+        """Sends INIT and waits for the config and MTU notifications, filling in
+        resolution and mtu_size from the device, the stored profile or the link."""
+        self._msg_index = 0
+        self._config_event, self._mtu_event = asyncio.Event(), asyncio.Event()
+        self.driver = self.resolution = None
+        if not self._notifying:
+            await self.client.start_notify(CHARACTERISTIC_UUID, self._notification_handler)
+            self._notifying = True
+        await send_command(self.client, EpdCmd.INIT)
+        try:
+            await asyncio.wait_for(asyncio.gather(self._config_event.wait(), self._mtu_event.wait()),
+                                   timeout=PROFILE_HANDSHAKE_TIMEOUT if self.profile else HANDSHAKE_TIMEOUT)
+        except asyncio.TimeoutError:
+            if self.profile: logger.info("Config/MTU not received yet. Using stored profile.")
+            else: logger.warning("Timed out waiting for config/MTU. Using defaults.")
+
+        self.reconcile_profile()
+        if self.resolution is None and self.profile:
+            self.resolution = self.profile.get('resolution')
+        if not self._mtu_event.is_set():
+            self.mtu_size = (self.profile or {}).get('mtu') or self.client.mtu_size
+
+    async def resume(self, checkpoint):
+        """Prepares a reconnected session to continue an interrupted frame. INIT is not
+        sent, as it re-initialises the controller; resolution and MTU are taken from
+        the connection the checkpoint's progress was made on."""
+        self._msg_index = 0
+        self._config_event, self._mtu_event = asyncio.Event(), asyncio.Event()
+        if not self._notifying:
+            await self.client.start_notify(CHARACTERISTIC_UUID, self._notification_handler)
+            self._notifying = True
+        self.resolution, self.mtu_size = checkpoint.resolution, checkpoint.mtu_size
+        logger.info(f"Resuming without INIT: resolution {self.resolution}, MTU {self.mtu_size}")
+
+    def reconcile_profile(self):
+        """Records what the device reported; whatever it did report wins over the stored profile."""
+        if self.profiles is None: return
+        learned = {}
+        if self.driver is not None:
+            learned.update(driver=self.driver, resolution=self.resolution)
+        if self._mtu_event and self._mtu_event.is_set():
+            learned['mtu'] = self.mtu_size
+        if not learned or (self.profile and all(self.profile.get(key) == value for key, value in learned.items())):
+            return
+        if self.profile: logger.warning(f"Stored profile for {self.address} is stale, refreshing.")
+        self.profile = self.profiles.update(self.address, **learned)
+
+async def scan_devices(adapter=None, timeout=SCAN_TIMEOUT, epd_only=False, addresses=()):
+    """Prints devices as they are discovered and returns the requested addresses that were not seen.
+
+    With epd_only, only devices advertising SERVICE_UUID are reported. With
+    addresses, the scan stops as soon as all of them have been seen instead
+    of running for the whole timeout.
+    """
+    wanted = {address.upper() for address in addresses}
+    seen = set()
+    all_seen = asyncio.Event()
+
+    def on_device(device, advertisement):
+        if device.address.upper() in seen: return
+        seen.add(device.address.upper())
+        click.echo(f"{device.address}  {advertisement.rssi:>4} dBm  {device.name or advertisement.local_name or ''}")
+        if wanted and wanted <= seen: all_seen.set()
+
+    scanner = bleak.BleakScanner(on_device, service_uuids=[SERVICE_UUID] if epd_only else None, adapter=adapter)
+    async with scanner:
+        try:
+            await asyncio.wait_for(all_seen.wait(), timeout)
+        except asyncio.TimeoutError:
+            pass
+    return wanted - seen
+
+async def set_time(client, mode_byte):
+    logger.info(f"Sending Set Time command (mode: {mode_byte})...")
+    timestamp = int(time.time())
+    tz_offset = -time.timezone // 3600
+    data = bytearray()
+    data.extend(timestamp.to_bytes(4, 'big'))
+    data.append(tz_offset)
+    data.append(mode_byte)
+    await send_command(client, EpdCmd.SET_TIME, data)
+    logger.info("Time sync command sent successfully.")
+
+async def clear_screen(client):
+    logger.info("Sending Init command...")
+    await send_command(client, EpdCmd.INIT)
+    await asyncio.sleep(0.5)
+    logger.info("Sending Clear Screen command...")
+    await send_command(client, EpdCmd.CLEAR)
+    await asyncio.sleep(1)
+    logger.info("Sending Refresh command...")
+    await send_command(client, EpdCmd.REFRESH)
+    logger.info("Clear screen sequence sent successfully.")
+
+def count_uniform_planes(planes, width):
+    """Counts uniform planes (typically an all "no red" plane) for the metrics. They are
+    still sent in full: the protocol has no fill command and INIT re-initialises the
+    controller, so its RAM cannot be reused."""
+    for step, plane in zip(('bw', 'red'), planes):
+        if uniform_plane_value(plane, width) is not None:
+            logger.debug(f"Plane {step} is uniform.")
+            count('uniform_planes')
+
+async def send_frame(session, planes, interleaved_count, clear=False, flow_control='adaptive', checkpoint=None, resumed=False):
+    """Writes the planes and refreshes the panel on a session that has completed its handshake.
+
+    Planes may be PlaneStreams that are still being rendered. A checkpoint
+    records the acknowledged progress. resumed means the session skipped
+    INIT to continue that progress (see DeviceSession.resume): planes
+    acknowledged in full are skipped and the interrupted one continues with
+    continuation chunks. If the device answers a resumed write with an error
+    while the link is still up, it gets a full handshake and the whole frame.
+    """
+    if flow_control == 'adaptive' and session.window is None:
+        session.window = AdaptiveWindow(interleaved_count)
+    window = session.window if flow_control == 'adaptive' else None
+    if checkpoint:
+        if not resumed: checkpoint.acked.clear()
+        checkpoint.resolution, checkpoint.mtu_size = session.resolution, session.mtu_size
+
+    async def write_planes(clear):
+        if clear:
+            with span('clear'):
+                await send_command(session.client, EpdCmd.CLEAR); await asyncio.sleep(2)
+        with span('transfer'):
+            for step, plane in zip(('bw', 'red'), planes):
+                if checkpoint and checkpoint.acked.get(step, 0) >= len(plane): continue
+                await write_image_data(session.client, plane, session.mtu_size, interleaved_count, step=step,
+                                       window=window, checkpoint=checkpoint)
+
+    if resumed:
+        logger.info(f"Resuming transfer after {sum(checkpoint.acked.values())} acknowledged bytes.")
+        count('resumes')
+    try:
+        await write_planes(clear and not resumed) # A resumed frame was cleared on its first attempt
+    except bleak.exc.BleakError as e:
+        if not resumed or not session.is_connected: raise
+        logger.warning(f"Device rejected the resumed transfer ({e}), sending the whole frame.")
+        count('resumes_rejected')
+        checkpoint.acked.clear()
+        with span('handshake'):
+            await session.handshake()
+        await write_planes(clear)
+    with span('refresh'):
+        await send_command(session.client, EpdCmd.REFRESH); await asyncio.sleep(5)
+
+# --- Frame Cache ---
+
+def file_digest(path, chunk_size=1024 * 1024):
+    """sha256 hexdigest of a file, read in chunks so a large image is never held in memory whole."""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+class FrameCache:
+    """Content-addressed on-disk store of packed frames with size-bounded LRU eviction.
+
+    Entries are keyed by a hash of the source (image bytes or text markup)
+    and every setting that affects the rendered frame. Reads refresh the
+    file's mtime, which is what eviction orders by. Frames seen by this
+    instance are also kept in memory, up to max_memory_bytes with the least
+    recently used dropped first, so one instance shared by several sends
+    renders each frame once; with persist=False nothing touches disk.
+    """
+    VERSION = 2
+
+    def __init__(self, directory=None, max_bytes=FRAME_CACHE_MAX_BYTES, persist=True, max_memory_bytes=FRAME_CACHE_MEMORY_BYTES):
+        self.directory = directory or os.path.join(CACHE_DIR, 'frames')
+        self.max_bytes = max_bytes
+        self.persist = persist
+        self.max_memory_bytes = max_memory_bytes
+        self._memory = collections.OrderedDict()
+        self._memory_bytes = 0
+        self._locks = {}
+        self._guard = threading.Lock()
+
+    @contextlib.contextmanager
+    def lock(self, key):
+        """Holds a lock per key while a frame is looked up and rendered. A key's lock
+        is dropped once nobody holds or waits for it."""
+        with self._guard:
+            entry = self._locks.setdefault(key, [threading.Lock(), 0])
+            entry[1] += 1
+        try:
+            with entry[0]:
+                yield
+        finally:
+            with self._guard:
+                entry[1] -= 1
+                if not entry[1]: del self._locks[key]
+
+    def _remember(self, key, data):
+        with self._guard:
+            old = self._memory.pop(key, None)
+            if old is not None: self._memory_bytes -= len(old)
+            self._memory[key] = data
+            self._memory_bytes += len(data)
+            while self._memory_bytes > self.max_memory_bytes and len(self._memory) > 1:
+                _, evicted = self._memory.popitem(last=False)
+                self._memory_bytes -= len(evicted)
+
+    @classmethod
+    def key(cls, source_digest, **params):
+        """source_digest is the sha256 hexdigest of the image file (see file_digest) or of the text markup."""
+        params = dict(params, source=source_digest, version=cls.VERSION)
+        return hashlib.sha256(json.dumps(params, sort_keys=True).encode('utf-8')).hexdigest()
+
+    def _path(self, key):
+        return os.path.join(self.directory, f"{key}.frame")
+
+    def get(self, key):
+        with self._guard:
+            data = self._memory.get(key)
+            if data is not None:
+                self._memory.move_to_end(key)
+                return data
+        if not self.persist: return None
+        path = self._path(key)
+        try:
+            with open(path, 'rb') as f:
+                data = f.read()
+        except OSError:
+            return None
+        try:
+            os.utime(path)
+        except OSError:
+            pass # A read-only cache still serves hits; its entries just don't move up the LRU order
+        self._remember(key, data)
+        return data
+
+    def put(self, key, data):
+        self._remember(key, data)
+        if not self.persist: return
+        os.makedirs(self.directory, exist_ok=True)
+        tmp_path = f"{self._path(key)}.{os.getpid()}.tmp"
+        with open(tmp_path, 'wb') as f:
+            f.write(data)
+        os.replace(tmp_path, self._path(key))
+        self.prune()
+
+    def entries(self):
+        """Returns (path, size, mtime) for every entry, least recently used first."""
+        try:
+            names = os.listdir(self.directory)
+        except FileNotFoundError:
+            return []
+        entries = []
+        for name in names:
+            if not name.endswith('.frame'): continue
+            path = os.path.join(self.directory, name)
+            try:
+                st = os.stat(path)
+            except FileNotFoundError:
+                continue
+            entries.append((path, st.st_size, st.st_mtime))
+        return sorted(entries, key=lambda entry: entry[2])
+
+    def stats(self):
+        entries = self.entries()
+        return {'directory': self.directory, 'entries': len(entries),
+                'bytes': sum(size for _, size, _ in entries), 'max_bytes': self.max_bytes}
+
+    def prune(self, max_bytes=None):
+        """Evicts least recently used entries until the cache fits in max_bytes."""
+        max_bytes = self.max_bytes if max_bytes is None else max_bytes
+        entries = self.entries()
+        total = sum(size for _, size, _ in entries)
+        removed = freed = 0
+        for path, size, _ in entries:
+            if total <= max_bytes: break
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            total -= size; removed += 1; freed += size
+        return removed, freed
+
+# --- Frame Files ---
+
+FRAME_FILE_MAGIC = b'EPDF'
+FRAME_FILE_VERSION = 1
+FRAME_FILE_HEADER = struct.Struct('<4sBBHHB') # magic, version, colour mode, width, height, plane count
+FRAME_FILE_COLOR_MODES = ('bw', 'bwr')
+FRAME_FILE_SUFFIX = '.epdf'
+
+def write_frame_file(path, planes, width, height, color_mode):
+    """Writes packed planes behind a header holding the resolution, colour mode and
+    every plane's length, so the planes can be sent without decoding anything."""
+    header = FRAME_FILE_HEADER.pack(FRAME_FILE_MAGIC, FRAME_FILE_VERSION, FRAME_FILE_COLOR_MODES.index(color_mode),
+                                    width, height, len(planes))
+    header += struct.pack(f'<{len(planes)}I', *(len(plane) for plane in planes))
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, 'wb') as f:
+        f.write(header)
+        for plane in planes:
+            f.write(plane)
+    os.replace(tmp_path, path)
+
+def load_frame_file(path):
+    """Maps a frame file into memory and returns (width, height, color_mode, planes).
+
+    The planes are memoryviews into the mapping, not copies; it is unmapped
+    once they are garbage collected. Raises ValueError for anything that is
+    not a complete frame file.
+    """
+    with open(path, 'rb') as f:
+        try:
+            data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError: # Empty file
+            raise ValueError(f"{path} is not a frame file")
+    view = memoryview(data)
+    if len(view) < FRAME_FILE_HEADER.size:
+        raise ValueError(f"{path} is not a frame file")
+    magic, version, mode, width, height, plane_count = FRAME_FILE_HEADER.unpack_from(view)
+    if magic != FRAME_FILE_MAGIC or version != FRAME_FILE_VERSION or mode >= len(FRAME_FILE_COLOR_MODES):
+        raise ValueError(f"{path} is not a version {FRAME_FILE_VERSION} frame file")
+    color_mode = FRAME_FILE_COLOR_MODES[mode]
+    offset = FRAME_FILE_HEADER.size + 4 * plane_count
+    lengths = struct.unpack_from(f'<{plane_count}I', view, FRAME_FILE_HEADER.size) if len(view) >= offset else ()
+    expected = (width + 7) // 8 * height
+    if (len(lengths) != plane_count or plane_count != (2 if color_mode == 'bwr' else 1)
+            or any(length != expected for length in lengths) or offset + sum(lengths) != len(view)):
+        raise ValueError(f"{path} is truncated or does not match {width}x{height} {color_mode}")
+    planes = []
+    for length in lengths:
+        planes.append(view[offset:offset + length])
+        offset += length
+    return width, height, color_mode, tuple(planes)
+
+# --- Device Profiles ---
+
+class DeviceProfiles:
+    """Per-address driver, resolution and MTU learned from earlier handshakes, stored as JSON."""
+
+    def __init__(self, path=None):
+        self.path = path or os.path.join(CACHE_DIR, 'devices.json')
+
+    def _load(self):
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def _save(self, profiles):
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        tmp_path = f"{self.path}.{os.getpid()}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(profiles, f, indent=2, sort_keys=True)
+        os.replace(tmp_path, self.path)
+
+    def get(self, address):
+        profile = self._load().get(address.upper())
+        if profile and profile.get('resolution'):
+            profile['resolution'] = tuple(profile['resolution'])
+        return profile
+
+    def update(self, address, **fields):
+        profiles = self._load()
+        profile = profiles.setdefault(address.upper(), {})
+        profile.update(fields, updated=int(time.time()))
+        try:
+            self._save(profiles)
+        except OSError as e:
+            logger.warning(f"Could not save device profile: {e}")
+        return self.get(address) or profile
+
+    def forget(self, address):
+        profiles = self._load()
+        if profiles.pop(address.upper(), None) is not None:
+            self._save(profiles)
+
+    def forget_frame(self, address):
+        """Called after anything else was drawn, so the next send is not skipped as unchanged."""
+        profile = self.get(address)
+        if profile and profile.get('frame_digest'):
+            self.update(address, frame_digest=None)
+
+def frame_digest(planes, resolution):
+    """Identifies packed planes at a resolution, to recognise a frame the panel already shows."""
+    digest = hashlib.sha256(f"{resolution[0]}x{resolution[1]}:{len(planes)}".encode('ascii'))
+    for plane in planes:
+        digest.update(plane)
+    return digest.hexdigest()
+
+# --- Text Rendering ---
+
+LINE_MARKUP = re.compile(r'^\s*\[(.*?)\]\s*(.*)')
+TEXT_COLORS = {'red': (255, 0, 0), 'white': (255, 255, 255), 'black': (0, 0, 0)}
 
 def parse_line_markup(line):
     """Parses a line for [key=value, ...] markup."""
-    markup_match = re.match(r'^\s*\[(.*?)\]\s*(.*)', line)
+    markup_match = LINE_MARKUP.match(line)
     if not markup_match:
         return {}, line
 
@@ -160,220 +1131,441 @@ def parse_line_markup(line):
             props[key.strip()] = value.strip()
     return props, text
 
+@functools.lru_cache(maxsize=FONT_CACHE_SIZE)
+def load_font(font_path, font_size):
+    """Loads a font once per process, falling back to Pillow's default font."""
+    try:
+        return ImageFont.truetype(font_path, font_size)
+    except IOError:
+        logger.warning(f"Could not load font {font_path}. Using default.")
+        return ImageFont.load_default()
+
+@functools.lru_cache(maxsize=GLYPH_CACHE_SIZE)
+def rasterize_line(font, text, x_fraction):
+    """Coverage mask of one line of text drawn at x_fraction (0 <= x_fraction < 1) of a pixel,
+    and the integer offset of the mask from the drawing origin.
+
+    Lines that come back, such as clock digits or recurring prices, are
+    rasterised once per process. Pasting the fill through the mask blends
+    exactly as ImageDraw.text does, since a mask drawn at a whole-pixel
+    offset is the same mask shifted.
+    """
+    left, top, right, bottom = font.getbbox(text)
+    pad = 2 # Room for the sub-pixel shift and antialiasing
+    x0, y0 = left - pad, top - pad
+    mask = Image.new('L', (right - x0 + pad, bottom - y0 + pad), 0)
+    ImageDraw.Draw(mask).text((x_fraction - x0, -y0), text, font=font, fill=255)
+    return mask, (x0, y0)
+
+def merge_row_ranges(ranges):
+    """Sorts (top, bottom) row ranges and merges the ones that overlap or touch."""
+    merged = []
+    for top, bottom in sorted(ranges):
+        if merged and top <= merged[-1][1]:
+            merged[-1][1] = max(merged[-1][1], bottom)
+        else:
+            merged.append([top, bottom])
+    return merged
+
+class TextTemplate:
+    """Text markup compiled once for repeated renders, with {name} fields filled in per render.
+
+    The markup is parsed and the fonts are loaded up front. The last frame
+    for each resolution and colour setting is kept, so when only some lines
+    change, render_planes redraws, re-dithers and re-packs just the rows
+    those lines cover. Error diffusion carries into every row below a
+    change, so with those algorithms the whole frame is re-dithered and
+    the rows from the first change down are re-packed. Safe to share
+    between threads.
+    """
+
+    def __init__(self, text, font, size, color, bg_color):
+        self.background = {'white': (255, 255, 255), 'black': (0, 0, 0), 'red': (255, 0, 0)}.get(bg_color, (255, 255, 255))
+        self.lines = []
+        # Replace literal '\n' with actual newline characters before splitting
+        for line in text.replace('\\n', '\n').splitlines():
+            props, line_text = parse_line_markup(line)
+            line_font = load_font(props.get('font', font), int(props.get('size', size)))
+            fill = TEXT_COLORS.get(props.get('color', color).lower(), (0, 0, 0))
+            self.lines.append((line_text, line_font, fill, props.get('align', 'left')))
+        self._frames = {}
+        self._lock = threading.Lock()
+
+    def layout(self, width, fields=None):
+        """Places every line as (x, y, text, top, bottom), where rows top..bottom hold its ink."""
+        placed = []
+        y_text = 0
+        for text, font, _, align in self.lines:
+            if fields is not None:
+                try:
+                    text = text.format_map(fields)
+                except KeyError as e:
+                    raise ValueError(f"Missing template field {e}") from None
+            bbox = font.getbbox(text)
+            text_width = bbox[2] - bbox[0]
+            text_height = bbox[3] - bbox[1]
+
+            x_text = 0
+            if align == 'center':
+                x_text = (width - text_width) / 2
+            elif align == 'right':
+                x_text = width - text_width
+            placed.append((x_text, y_text, text, y_text + bbox[1], y_text + bbox[3]))
+            y_text += text_height + 2 # Add a small padding
+        return placed
+
+    def draw_rows(self, placed, width, top, bottom):
+        """Draws rows top..bottom of a laid out frame."""
+        image = Image.new('RGB', (width, bottom - top), self.background)
+        draw = ImageDraw.Draw(image)
+        for (x_text, y_text, text, ink_top, ink_bottom), (_, font, fill, _) in zip(placed, self.lines):
+            if not (ink_top < bottom and ink_bottom > top): continue
+            if x_text < 0 and x_text != int(x_text): # ImageDraw rounds towards zero here; draw it directly
+                draw.text((x_text, y_text - top), text, font=font, fill=fill)
+                continue
+            whole = math.floor(x_text)
+            mask, (dx, dy) = rasterize_line(font, text, x_text - whole)
+            image.paste(fill, (whole + dx, y_text - top + dy), mask)
+        return image
+
+    def render_image(self, width, height, fields=None):
+        return self.draw_rows(self.layout(width, fields), width, 0, height)
+
+    def render_planes(self, width, height, fields=None, color_mode='bw', dither_algo='auto'):
+        """Returns the packed planes, reusing the rows of the previous render that did not change."""
+        algorithm = 'none' if dither_algo == 'auto' else dither_algo
+        settings = (width, height, color_mode, algorithm)
+        with self._lock:
+            placed = self.layout(width, fields)
+            if settings in self._frames:
+                previous, canvas, planes = self._frames[settings]
+                changed = [(line, old) for line, old in zip(placed, previous) if line != old]
+                rows = ((max(0, line[3]), min(height, line[4])) for pair in changed for line in pair)
+                bands = merge_row_ranges((top, bottom) for top, bottom in rows if top < bottom)
+            else:
+                changed = placed
+                canvas = Image.new('RGB', (width, height))
+                planes = [bytearray((width + 7) // 8 * height) for _ in range(2 if color_mode == 'bwr' else 1)]
+                bands = [[0, height]]
+            if changed: count('lines_redrawn', len(changed))
+
+            with span('render_text'):
+                for top, bottom in bands:
+                    canvas.paste(self.draw_rows(placed, width, top, bottom), (0, top))
+            palette = color_palette(color_mode)
+            if bands and algorithm in ERROR_DIFFUSION_MATRICES:
+                # Error carries into every row below the first change; the rows above dither as before.
+                dithered = apply_dither(canvas, palette, algorithm)
+                bands = [[bands[0][0], height]]
+            row_bytes = (width + 7) // 8
+            for top, bottom in bands:
+                if algorithm in ERROR_DIFFUSION_MATRICES:
+                    rows = dithered.crop((0, top, width, bottom))
+                else:
+                    rows = canvas.crop((0, top, width, bottom))
+                if algorithm in ORDERED_DITHER_MATRICES:
+                    with span('dither'):
+                        rows = ordered_dither(rows, palette, ORDERED_DITHER_MATRICES[algorithm](), row_offset=top)
+                with span('pack'):
+                    for plane, packed in zip(planes, pixels_to_planes(np.asarray(rows), color_mode)):
+                        plane[top * row_bytes:bottom * row_bytes] = packed
+            self._frames[settings] = (placed, canvas, planes)
+            return tuple(bytes(plane) for plane in planes)
+
+@functools.lru_cache(maxsize=TEMPLATE_CACHE_SIZE)
+def compile_template(text, font, size, color, bg_color):
+    """Returns the TextTemplate for this markup, compiling it once per process."""
+    return TextTemplate(text, font, size, color, bg_color)
+
 def render_text_to_image(text_content, width, height, default_font_path, default_font_size, default_color, bg_color):
-    bg_color_map = {
-        'white': (255, 255, 255),
-        'black': (0, 0, 0),
-        'red': (255, 0, 0)
-    }
-    image = Image.new('RGB', (width, height), bg_color_map.get(bg_color, (255, 255, 255)))
-    draw = ImageDraw.Draw(image)
-    y_text = 0
-    
-    cached_fonts = {}
-
-    # Replace literal '\n' with actual newline characters before splitting
-    processed_text = text_content.replace('\\n', '\n')
-
-    for line in processed_text.splitlines():
-        props, text = parse_line_markup(line)
-
-        # Determine properties for the current line
-        font_size = int(props.get('size', default_font_size))
-        font_path = props.get('font', default_font_path)
-        color = props.get('color', default_color)
-        align = props.get('align', 'left')
-
-        # Load font, caching to avoid reloading
-        font_key = (font_path, font_size)
-        if font_key not in cached_fonts:
-            try:
-                cached_fonts[font_key] = ImageFont.truetype(font_path, font_size)
-            except IOError:
-                logger.warning(f"Could not load font {font_path}. Using default.")
-                cached_fonts[font_key] = ImageFont.load_default()
-        font = cached_fonts[font_key]
-
-        # Calculate text position
-        bbox = font.getbbox(text)
-        text_width = bbox[2] - bbox[0]
-        text_height = bbox[3] - bbox[1]
-        
-        x_text = 0
-        if align == 'center':
-            x_text = (width - text_width) / 2
-        elif align == 'right':
-            x_text = width - text_width
+    return TextTemplate(text_content, default_font_path, default_font_size, default_color, bg_color).render_image(width, height)
+
+# --- Main Logic ---
 
-        # Draw text
-        color_map = {'red': (255, 0, 0), 'white': (255, 255, 255), 'black': (0, 0, 0)}
-        fill_color = color_map.get(color.lower(), (0, 0, 0))
-        draw.text((x_text, y_text), text, font=font, fill=fill_color)
-        y_text += text_height + 2 # Add a small padding
+def prepare_image(img, text, width, height, font, size, color, bg_color, color_mode='bw', dither_algo='auto', resize_mode='stretch', on_rows=None):
+    """Renders or resizes the source to width x height and dithers it to the palette.
+    on_rows receives the final uint8 rows as they are ready, in order."""
+    if img is None: # Text is rendered directly at the target size
+        with span('render_text'):
+            img = render_text_to_image(text, width, height, font, size, color, bg_color)
+    else:
+        with span('resize'):
+            if resize_mode == 'fit':
+                img = img.copy()
+                img.thumbnail((width, height))
+                new_img = Image.new('RGB', (width, height), (255, 255, 255))
+                new_img.paste(img, ((width - img.width) // 2, (height - img.height) // 2))
+                img = new_img
+            elif resize_mode == 'crop':
+                img = ImageOps.fit(img, (width, height), Image.Resampling.LANCZOS)
+            else: # stretch
+                img = img.resize((width, height))
+
+    # Decide on dithering
+    final_dither_algo = dither_algo
+    if final_dither_algo == 'auto':
+        if text is None:
+            final_dither_algo = 'floyd'
+            logger.info("Auto-selecting 'floyd' dithering for image.")
+        else: # text
+            final_dither_algo = 'none'
+            logger.info("Auto-disabling dithering for text.")
+
+    if final_dither_algo != 'none':
+        logger.info(f"Applying {final_dither_algo} dithering...")
+        palette = color_palette(color_mode)
+        img = apply_dither(img, palette, final_dither_algo, on_rows)
+    elif on_rows:
+        on_rows(np.asarray(img.convert('RGB')))
+    return img
+
+def render_frame(image_path, text, width, height, font=None, size=None, color=None, bg_color=None, color_mode='bw', dither_algo='auto', resize_mode='stretch', frame_cache=None, save_path=None, on_planes=None):
+    """Produces the packed planes for an image file or text markup, going through frame_cache when given.
+
+    Safe to run in worker threads; threads rendering the same frame into one
+    cache wait for each other instead of rendering it twice. on_planes, if
+    given, receives the planes of each band of rows as it is dithered and
+    packed; it is not called on a cache hit.
+    """
+    if not frame_cache:
+        return _render_frame(image_path, text, width, height, font, size, color, bg_color, color_mode, dither_algo, resize_mode, save_path, on_planes)
+    frame_params = {'width': width, 'height': height, 'color_mode': color_mode,
+                    'dither': dither_algo, 'resize_mode': resize_mode}
+    if image_path is None:
+        frame_params.update(font=font, size=size, color=color, bg_color=bg_color)
+        source_digest = hashlib.sha256(text.encode('utf-8')).hexdigest()
+    else:
+        with span('read'):
+            source_digest = file_digest(image_path)
+    frame_key = FrameCache.key(source_digest, **frame_params)
+    with frame_cache.lock(frame_key):
+        cached = None if save_path else frame_cache.get(frame_key)
+        if cached is not None:
+            logger.info(f"Using cached frame {frame_key[:12]}")
+            count('cache_hits')
+            return split_planes(cached, color_mode)
+        count('cache_misses')
+        planes = _render_frame(image_path, text, width, height, font, size, color, bg_color, color_mode, dither_algo, resize_mode, save_path, on_planes)
+        try:
+            frame_cache.put(frame_key, b''.join(planes))
+        except OSError as e:
+            logger.warning(f"Could not write frame cache: {e}")
+        return planes
+
+def decode_image(image_path, width, height, resize_mode='stretch'):
+    """Decodes an image file at no more than DECODE_REDUCING_GAP times the size resize_mode needs.
+
+    JPEG is decoded at a reduced DCT scale (draft mode); other formats are
+    shrunk by a whole factor with reduce() straight after decoding. The
+    final resize in prepare_image then works from the reduced image, and the
+    full-size decode is dropped before this returns. The file is read as it
+    is decoded rather than held in memory.
+    """
+    with span('decode'), Image.open(image_path) as img: # Pillow names the file if it cannot identify it
+        scale_x, scale_y = width / img.width, height / img.height
+        if resize_mode == 'fit':
+            scale_x = scale_y = min(scale_x, scale_y)
+        elif resize_mode == 'crop':
+            scale_x = scale_y = max(scale_x, scale_y)
+        needed = (max(1, math.ceil(img.width * scale_x * DECODE_REDUCING_GAP)),
+                  max(1, math.ceil(img.height * scale_y * DECODE_REDUCING_GAP)))
+        img.draft(None, needed)
+        try:
+            img.load()
+        except OSError as e:
+            raise OSError(f"Cannot decode {image_path}: {e}") from e
+        count('decoded_pixels', img.width * img.height)
+        factor = min(img.width // needed[0], img.height // needed[1])
+        if factor > 1 and img.mode in REDUCIBLE_MODES:
+            return img.reduce(factor)
+        return img
+
+def _render_frame(image_path, text, width, height, font, size, color, bg_color, color_mode, dither_algo, resize_mode, save_path, on_planes):
+    img = None
+    if image_path is not None:
+        img = decode_image(image_path, width, height, resize_mode)
+    bands = []
+
+    def on_rows(rows): # Bands are packed as they are streamed, so the whole image is not packed again
+        planes = pixels_to_planes(rows, color_mode)
+        bands.append(planes)
+        on_planes(planes)
+
+    img = prepare_image(img, text, width, height, font, size, color, bg_color, color_mode, dither_algo, resize_mode,
+                        on_rows if on_planes else None)
+
+    if save_path:
+        try:
+            logger.info(f"Saving final image to {save_path}")
+            img.save(save_path)
+        except IOError as e:
+            logger.error(f"Failed to save image to {save_path}: {e}")
+            # We can decide to either exit or just continue without saving
+            # For now, we'll just log the error and continue.
+
+    if on_planes:
+        return tuple(b''.join(band) for band in zip(*bands))
+    return image_to_planes(img, color_mode)
+
+def start_render(image_path, text, width, height, font=None, size=None, color=None, bg_color=None, color_mode='bw', dither_algo='auto', resize_mode='stretch', frame_cache=None, save_path=None):
+    """Runs render_frame in a worker thread while the event loop carries on.
+
+    Returns the planes as PlaneStreams, which fill band by band as rows are
+    dithered (or all at once on a cache hit), and the task that resolves to
+    the finished planes. Must be called from the event loop.
+    """
+    streams = tuple(PlaneStream((width + 7) // 8 * height) for _ in range(2 if color_mode == 'bwr' else 1))
+    streamed = []
+
+    def on_planes(planes):
+        streamed.append(len(planes[0]))
+        for stream, plane in zip(streams, planes):
+            stream.feed(plane)
+
+    def run():
+        try:
+            planes = render_frame(image_path, text, width, height, font, size, color, bg_color, color_mode, dither_algo,
+                                  resize_mode, frame_cache=frame_cache, save_path=save_path, on_planes=on_planes)
+        except BaseException as e:
+            for stream in streams: stream.fail(e)
+            raise
+        if not streamed: # Cache hit
+            for stream, plane in zip(streams, planes): stream.feed(plane)
+        return planes
 
-    return image
+    return streams, asyncio.ensure_future(asyncio.to_thread(run))
 
-async def main_logic(address, adapter, image_path=None, text=None, font=None, size=None, color=None, bg_color=None, width=None, height=None, clear=False, color_mode='bw', dither_algo='auto', resize_mode='stretch', interleaved_count=31, retry=3, command_to_run=None, mode_byte=None, save_path=None):
+async def main_logic(address, adapter, image_path=None, text=None, font=None, size=None, color=None, bg_color=None, width=None, height=None, clear=False, color_mode='bw', dither_algo='auto', resize_mode='stretch', interleaved_count=31, retry=3, command_to_run=None, mode_byte=None, save_path=None, use_cache=True, use_profile=True, frame_cache=None, flow_control='adaptive', frame_path=None, force=False, resume=False, retry_delay=RETRY_BASE_DELAY, retry_max_delay=RETRY_MAX_DELAY):
+    """Runs one command or send against one device. Returns True on success."""
     if command_to_run:
-        client = BleakClient(address, adapter=adapter)
+        session = DeviceSession(address, adapter)
+        success = False
         try:
             logger.info(f"Connecting to {address} to send a simple command...")
-            await client.connect()
-            if command_to_run == 'set_time':
-                logger.info(f"Sending Set Time command (mode: {mode_byte})...")
-                timestamp = int(time.time())
-                tz_offset = -time.timezone // 3600
-                data = bytearray()
-                data.extend(timestamp.to_bytes(4, 'big'))
-                data.append(tz_offset)
-                data.append(mode_byte)
-                await send_command(client, EpdCmd.SET_TIME, data)
-                logger.info("Time sync command sent successfully.")
-            elif command_to_run == 'clear_screen':
-                logger.info("Sending Init command...")
-                await send_command(client, EpdCmd.INIT)
-                await asyncio.sleep(0.5)
-                logger.info("Sending Clear Screen command...")
-                await send_command(client, EpdCmd.CLEAR)
-                await asyncio.sleep(1)
-                logger.info("Sending Refresh command...")
-                await send_command(client, EpdCmd.REFRESH)
-                logger.info("Clear screen sequence sent successfully.")
-            await asyncio.sleep(1) # Give time for command to process
+            with span('connect'):
+                await session.connect()
+            with span('command'):
+                if command_to_run == 'set_time':
+                    await set_time(session.client, mode_byte)
+                elif command_to_run == 'clear_screen':
+                    await clear_screen(session.client)
+                await asyncio.sleep(1) # Give time for command to process
+            success = True
         except Exception as e:
             logger.error(f"Failed to send command: {e}", exc_info=True)
         finally:
-            if client.is_connected:
-                await client.disconnect()
-        return
-
-    # Pre-calculate image to avoid re-calculating on retry
-    if image_path:
-        logger.info(f"Opening image: {image_path}")
-        with Image.open(image_path) as img_opened:
-            img = img_opened.copy() # Work on a copy
-    elif text:
-        # Resolution must be known before rendering text
-        # We will determine it in the first connection attempt
-        img = None
+            with span('disconnect'):
+                await session.close()
+        if success: DeviceProfiles().forget_frame(address)
+        return success
+
+    # Only the image header is checked up front; the file is hashed and
+    # decoded from its path once the resolution is known, and only decoded
+    # on a cache miss. A prepared frame is sent as is. Rendering runs in a
+    # worker thread, alongside connecting when the resolution is known up
+    # front and alongside the transfer otherwise.
+    planes = planes_resolution = None
+    if frame_path:
+        try:
+            with span('read'):
+                frame_width, frame_height, color_mode, planes = load_frame_file(frame_path)
+        except (OSError, ValueError) as e:
+            logger.error(f"Cannot use frame file: {e}")
+            return False
+        planes_resolution = (frame_width, frame_height)
+        image_path = text = None
+    elif image_path:
+        with span('read'):
+            try:
+                Image.open(image_path).close() # Only parses the header; fail before connecting
+            except (OSError, ValueError) as e:
+                logger.error(f"Cannot read image {image_path}: {e}")
+                return False
+        text = None
+    elif not text:
+        return False
     else:
-        return
+        image_path = None
+    if frame_cache is None and use_cache:
+        frame_cache = FrameCache()
+
+    profiles = DeviceProfiles()
+    profile = profiles.get(address) if use_profile else None
+    if profile:
+        logger.info(f"Loaded profile for {address}: driver {profile.get('driver')}, resolution {profile.get('resolution')}, MTU {profile.get('mtu')}")
+    render_options = dict(font=font, size=size, color=color, bg_color=bg_color, color_mode=color_mode, dither_algo=dither_algo,
+                          resize_mode=resize_mode, frame_cache=frame_cache, save_path=save_path)
+    render_task = None
+    if planes is None:
+        if width is not None and height is not None:
+            planes_resolution = (width, height)
+        elif width is None and height is None and profile and profile.get('resolution'):
+            planes_resolution = profile['resolution']
+        if planes_resolution and profile and profile.get('frame_digest') and not force and not clear:
+            # The finished frame decides whether to connect at all.
+            planes = await asyncio.to_thread(render_frame, image_path, text, *planes_resolution, **render_options)
+        elif planes_resolution:
+            planes, render_task = start_render(image_path, text, *planes_resolution, **render_options)
+    if (render_task is None and planes is not None and profile and not force and not clear
+            and profile.get('frame_digest') == frame_digest(planes, planes_resolution)):
+        logger.info("The device already shows this frame, skipping. Use --force to send anyway.")
+        count('frames_skipped')
+        return True
 
+    checkpoint = TransferCheckpoint() if resume else None
     for attempt in range(retry, -1, -1):
-        client = BleakClient(address, adapter=adapter)
+        session = DeviceSession(address, adapter, profiles, use_profile)
         try:
             logger.info(f"Attempting to connect to {address} (adapter: {adapter or 'default'})...")
-            await client.connect()
-            logger.info(f"Connected to {client.address}")
+            with span('connect'):
+                await session.connect()
+            logger.info(f"Connected to {session.client.address}")
 
             # --- Device Configuration ---
-            mtu_size_from_device = 0
-            resolution_from_device = None
-            config_event, mtu_event = asyncio.Event(), asyncio.Event()
-            msg_index = 0
-
-            def notification_handler(sender, data):
-                nonlocal mtu_size_from_device, msg_index, resolution_from_device
-                if msg_index == 0:
-                    logger.info(f"⇓ Received config: {data.hex()}")
-                    if len(data) >= 12:
-                        config = {'model_id': data[7]}
-                        driver_byte = config['model_id']
-                        resolution = DRIVER_TO_RESOLUTION.get(driver_byte)
-                        if resolution:
-                            resolution_from_device = resolution
-                            logger.info(f"Detected driver 0x{driver_byte:02x}, setting resolution to {resolution}")
-                        else: logger.warning(f"Unknown driver 0x{driver_byte:02x}")
-                    config_event.set()
-                else:
-                    try:
-                        if data.decode('utf-8').startswith('mtu='):
-                            mtu_size_from_device = int(data.decode('utf-8').split('=')[1])
-                            logger.info(f"MTU updated to: {mtu_size_from_device}")
-                            if not mtu_event.is_set(): mtu_event.set()
-                    except (UnicodeDecodeError, IndexError): pass
-                msg_index += 1
-
-            await client.start_notify(CHARACTERISTIC_UUID, notification_handler)
-            await send_command(client, EpdCmd.INIT)
-            try:
-                await asyncio.wait_for(asyncio.gather(config_event.wait(), mtu_event.wait()), timeout=10.0)
-            except asyncio.TimeoutError:
-                logger.warning("Timed out waiting for config/MTU. Using defaults.")
-                if not mtu_event.is_set(): mtu_size_from_device = client.mtu_size
-            
+            resumed = checkpoint is not None and checkpoint.resumable
+            with span('handshake'):
+                if resumed: await session.resume(checkpoint)
+                else: await session.handshake()
+
             final_width, final_height = width, height
             if final_width is None and final_height is None:
-                if resolution_from_device:
-                    final_width, final_height = resolution_from_device
+                if session.resolution:
+                    final_width, final_height = session.resolution
                 else:
                     logger.error("Resolution could not be determined. Please specify with --width and --height.")
-                    return
+                    return False
             logger.info(f"Using final resolution: {final_width}x{final_height}")
 
             # --- Image Preparation ---
-            if img is None and text: # Render text now that we have dimensions
-                img = render_text_to_image(text, final_width, final_height, font, size, color, bg_color)
-
-            if image_path: # Resize image now that we have dimensions
-                if resize_mode == 'fit':
-                    img.thumbnail((final_width, final_height))
-                    new_img = Image.new('RGB', (final_width, final_height), (255, 255, 255))
-                    new_img.paste(img, ((final_width - img.width) // 2, (final_height - img.height) // 2))
-                    img = new_img
-                elif resize_mode == 'crop':
-                    img = ImageOps.fit(img, (final_width, final_height), Image.Resampling.LANCZOS)
-                else: # stretch
-                    img = img.resize((final_width, final_height))
-
-            # Decide on dithering
-            final_dither_algo = dither_algo
-            if final_dither_algo == 'auto':
-                if image_path:
-                    final_dither_algo = 'floyd'
-                    logger.info("Auto-selecting 'floyd' dithering for image.")
-                else: # text
-                    final_dither_algo = 'none'
-                    logger.info("Auto-disabling dithering for text.")
-
-            if final_dither_algo != 'none':
-                logger.info(f"Applying {final_dither_algo} dithering...")
-                palette = THREE_COLOR_PALETTE if color_mode == 'bwr' else TWO_COLOR_PALETTE
-                dither_func = bayer_dither if final_dither_algo == 'bayer' else dither
-                img = dither_func(img, palette, final_dither_algo) if final_dither_algo != 'bayer' else dither_func(img, palette)
-
-            if save_path:
-                try:
-                    logger.info(f"Saving final image to {save_path}")
-                    img.save(save_path)
-                except IOError as e:
-                    logger.error(f"Failed to save image to {save_path}: {e}")
-                    # We can decide to either exit or just continue without saving
-                    # For now, we'll just log the error and continue.
+            if frame_path and planes_resolution != (final_width, final_height):
+                logger.error(f"Frame file is {planes_resolution[0]}x{planes_resolution[1]} but the device is {final_width}x{final_height}.")
+                return False
+            if render_task and render_task.done():
+                planes, render_task = render_task.result(), None
+            if planes is None or planes_resolution != (final_width, final_height):
+                if render_task: render_task.cancel() # Rendered for a stale resolution
+                planes_resolution = (final_width, final_height)
+                planes, render_task = start_render(image_path, text, *planes_resolution, **render_options)
 
             # --- Data Transfer ---
-            if clear:
-                await send_command(client, EpdCmd.CLEAR); await asyncio.sleep(2)
-
-            if color_mode == 'bwr':
-                epd_data = image_to_bwr_data(img)
-                half_len = len(epd_data) // 2
-                await write_image_data(client, epd_data[:half_len], mtu_size_from_device, interleaved_count, step='bw')
-                await write_image_data(client, epd_data[half_len:], mtu_size_from_device, interleaved_count, step='red')
-            else:
-                epd_data = image_to_bw_data(img)
-                await write_image_data(client, epd_data, mtu_size_from_device, interleaved_count, step='bw')
-            
-            await send_command(client, EpdCmd.REFRESH); await asyncio.sleep(5)
+            if checkpoint: checkpoint.use_for(planes_resolution)
+            await send_frame(session, planes, interleaved_count, clear, flow_control, checkpoint, resumed)
+            if render_task:
+                planes, render_task = await render_task, None
+            count_uniform_planes(planes, final_width)
             logger.info("🎉 Successfully sent image to device.")
-            break # Exit retry loop on success
+            session.reconcile_profile() # Keep notifications that arrived after the grace period
+            profiles.update(address, frame_digest=frame_digest(planes, planes_resolution))
+            return True
 
-        except (BleakDBusError, asyncio.TimeoutError, BleakDeviceNotFoundError, EOFError) as e:
+        except connection_errors() as e:
             logger.error(f"A connection error occurred: {e}")
             if attempt > 0:
-                backoff_delay = 16 ** (retry - attempt + 1)
-                logger.warning(f"Connection failed. Retrying in {backoff_delay} seconds... ({attempt-1} attempts left)")
-                await asyncio.sleep(backoff_delay)
+                delay = backoff_delay(retry - attempt, retry_delay, retry_max_delay)
+                logger.warning(f"Connection failed. Retrying in {delay:.1f} seconds... ({attempt} attempts left)")
+                count('retries')
+                with span('backoff'):
+                    await asyncio.sleep(delay)
                 continue
             else:
                 logger.error("All retry attempts failed. Giving up.")
@@ -382,50 +1574,728 @@ async def main_logic(address, adapter, image_path=None, text=None, font=None, si
             logger.error(f"An unhandled error occurred: {e}", exc_info=True)
             break # Don't retry on unknown errors
         finally:
-            if client.is_connected:
-                await client.stop_notify(CHARACTERISTIC_UUID)
-                await client.disconnect()
-                logger.info("Disconnected.")
-                await asyncio.sleep(3) # Allow event loop to process disconnection events
+            if session.is_connected:
+                with span('disconnect'):
+                    await session.close()
+                    await asyncio.sleep(3) # Allow event loop to process disconnection events
+    if render_task and not render_task.cancel():
+        render_task.exception() # Already reported; retrieve it so asyncio does not warn again
+    return False
+
+# --- Fan-out ---
+
+# Per-device keys accepted in an --address-file entry, mapped to main_logic arguments.
+DEVICE_OVERRIDES = {
+    'image': 'image_path', 'text': 'text', 'font': 'font', 'size': 'size', 'color': 'color',
+    'bg_color': 'bg_color', 'width': 'width', 'height': 'height', 'color_mode': 'color_mode',
+    'dither': 'dither_algo', 'resize_mode': 'resize_mode', 'frame': 'frame_path',
+}
+CONTENT_KEYS = ('image_path', 'text', 'frame_path')
+
+def load_device_list(path):
+    """Reads an address file: one bare address per line, or a JSON object with an
+    "address" key plus any of DEVICE_OVERRIDES. Blank lines and '#' comments are skipped."""
+    jobs = []
+    with open(path, 'r', encoding='utf-8') as f:
+        for line_no, line in enumerate(f, 1):
+            line = line.strip()
+            if not line or line.startswith('#'): continue
+            if not line.startswith('{'):
+                jobs.append((line, {}))
+                continue
+            try:
+                entry = json.loads(line)
+            except ValueError as e:
+                raise click.BadParameter(f"line {line_no}: {e}", param_hint='--address-file')
+            address = entry.pop('address', None)
+            unknown = set(entry) - set(DEVICE_OVERRIDES)
+            if not address or unknown:
+                raise click.BadParameter(f"line {line_no}: missing address or unknown keys {sorted(unknown)}", param_hint='--address-file')
+            overrides = {DEVICE_OVERRIDES[key]: value for key, value in entry.items()}
+            if any(key in overrides for key in CONTENT_KEYS): # Per-device content replaces the shared content
+                for key in CONTENT_KEYS: overrides.setdefault(key, None)
+            jobs.append((address, overrides))
+    return jobs
+
+async def fan_out(jobs, adapters, concurrency, **kwargs):
+    """Runs main_logic for every (address, overrides) job on one event loop.
+
+    Devices are spread round-robin over the adapters, with at most
+    `concurrency` connections per adapter. One frame cache is shared, so
+    identical content is rendered once per resolution and colour mode.
+    Returns the RunMetrics of every device, in job order.
+    """
+    adapters = list(adapters) or [None]
+    semaphores = {adapter: asyncio.Semaphore(concurrency) for adapter in adapters}
+    use_cache = kwargs.pop('use_cache', True)
+    frame_cache = FrameCache(persist=use_cache)
+
+    async def run(index, address, overrides):
+        adapter = adapters[index % len(adapters)]
+        async with semaphores[adapter]:
+            if len(jobs) > 1: current_device.set(address)
+            metrics = RunMetrics(address, adapter)
+            current_metrics.set(metrics)
+            start = time.monotonic()
+            try:
+                metrics.ok = await main_logic(address, adapter, **{**kwargs, **overrides}, frame_cache=frame_cache)
+            except Exception as e:
+                logger.error(f"Unhandled error: {e}", exc_info=True)
+                metrics.ok = False
+            metrics.seconds = time.monotonic() - start
+            return metrics
+
+    runs = await asyncio.gather(*(run(index, address, overrides) for index, (address, overrides) in enumerate(jobs)))
+    if len(runs) > 1:
+        logger.info(f"Summary: {sum(run.ok for run in runs)}/{len(runs)} devices succeeded")
+        for run in runs:
+            rate = run.to_dict()['bytes_per_second']
+            logger.info(f"  {run.address} ({run.adapter or 'default'}): {'OK' if run.ok else 'FAILED'} in {run.seconds:.1f}s"
+                        f"{f', {rate:.0f} B/s' if rate else ''}")
+    return runs
+
+# --- Batch Preparation ---
+
+PREPARE_KEYS = {key: value for key, value in DEVICE_OVERRIDES.items() if key != 'frame'}
+
+def load_prepare_jobs(source, defaults):
+    """Builds one job per image in a directory, or per line of a JSON-lines manifest.
+
+    Manifest lines may use any of PREPARE_KEYS plus "output" (file name of
+    the frame) and "address" (whose stored profile supplies the resolution
+    when width and height are not given). Blank lines and '#' comments are skipped.
+    """
+    jobs = []
+    if os.path.isdir(source):
+        extensions = set(Image.registered_extensions())
+        for name in sorted(os.listdir(source)):
+            stem, extension = os.path.splitext(name)
+            if extension.lower() in extensions:
+                jobs.append({**defaults, 'image_path': os.path.join(source, name), 'text': None, 'output': stem})
+        return jobs
+
+    profiles = DeviceProfiles()
+    with open(source, 'r', encoding='utf-8') as f:
+        for line_no, line in enumerate(f, 1):
+            line = line.strip()
+            if not line or line.startswith('#'): continue
+            try:
+                entry = json.loads(line)
+            except ValueError as e:
+                raise click.BadParameter(f"line {line_no}: {e}", param_hint='SOURCE')
+            if not isinstance(entry, dict):
+                raise click.BadParameter(f"line {line_no}: expected a JSON object", param_hint='SOURCE')
+            address, output = entry.pop('address', None), entry.pop('output', None)
+            unknown = set(entry) - set(PREPARE_KEYS)
+            if unknown or not (entry.get('image') or entry.get('text')):
+                raise click.BadParameter(f"line {line_no}: needs 'image' or 'text', unknown keys {sorted(unknown)}", param_hint='SOURCE')
+            job = {**defaults, 'image_path': None, 'text': None, **{PREPARE_KEYS[key]: value for key, value in entry.items()}}
+            profile = profiles.get(address) if address else None
+            if job['width'] is None and job['height'] is None and profile and profile.get('resolution'):
+                job['width'], job['height'] = profile['resolution']
+            if not output:
+                output = (address.replace(':', '') if address
+                          else os.path.splitext(os.path.basename(job['image_path']))[0] if job['image_path']
+                          else f"line-{line_no}")
+            job['output'] = output
+            jobs.append(job)
+    return jobs
+
+def prepare_frame(job, output_dir, use_cache=True):
+    """Renders one job to a frame file. Runs in a worker process, so it only takes picklable arguments.
+    Returns (output path, error message or None)."""
+    path = os.path.join(output_dir, job['output'] + FRAME_FILE_SUFFIX)
+    try:
+        if job['width'] is None or job['height'] is None:
+            raise ValueError("resolution unknown; pass --width and --height or an address with a stored profile")
+        planes = render_frame(job['image_path'], job['text'], job['width'], job['height'], job['font'], job['size'],
+                              job['color'], job['bg_color'], job['color_mode'], job['dither_algo'], job['resize_mode'],
+                              frame_cache=FrameCache() if use_cache else None)
+        write_frame_file(path, planes, job['width'], job['height'], job['color_mode'])
+    except Exception as e:
+        return path, str(e)
+    return path, None
+
+def prepare_frames(jobs, output_dir, workers=None, use_cache=True):
+    """Renders jobs across a process pool so dithering uses every core. Returns the failed (path, error) pairs."""
+    os.makedirs(output_dir, exist_ok=True)
+    workers = min(workers or os.cpu_count() or 1, len(jobs)) or 1
+    start = time.monotonic()
+    if workers == 1:
+        results = [prepare_frame(job, output_dir, use_cache) for job in jobs]
+    else:
+        with concurrent.futures.ProcessPoolExecutor(max_workers=workers) as pool:
+            futures = [pool.submit(prepare_frame, job, output_dir, use_cache) for job in jobs]
+            results = [future.result() for future in futures]
+    failed = [(path, error) for path, error in results if error]
+    for path, error in failed:
+        logger.error(f"Failed to prepare {path}: {error}")
+    logger.info(f"Prepared {len(results) - len(failed)}/{len(results)} frames in {time.monotonic() - start:.1f}s (workers: {workers})")
+    return failed
+
+# --- Simulator ---
+
+class SimulatedClient:
+    """Stand-in for BleakClient that behaves like a display running this protocol.
+
+    Writes without response are queued and return at once; a write with
+    response waits `latency` seconds for every write queued since the last
+    one and delivers them, which is roughly how a connection interval
+    drains. Writes still queued when the link drops are lost. Image chunks
+    are reassembled into planes so what arrived can be compared with what
+    was sent. Plane memory is kept per address across connections, like a
+    controller that stays powered, until INIT or CLEAR. A continuation chunk
+    for a plane that was never started is answered with an error on the next
+    write with response. drop_rate silently loses writes without response
+    and disconnect_rate drops the link on any write.
+    """
+
+    memory = {}
+
+    def __init__(self, address, adapter=None, driver=0x04, mtu=247, latency=0.0, drop_rate=0.0, disconnect_rate=0.0, seed=None):
+        self.address = address
+        self.adapter = adapter
+        self.driver = driver
+        self.mtu = mtu
+        self.mtu_size = mtu + 3 # ATT MTU, as bleak reports it
+        self.latency = latency
+        self.drop_rate = drop_rate
+        self.disconnect_rate = disconnect_rate
+        self.rng = random.Random(seed)
+        self.is_connected = False
+        self.planes = self.memory.setdefault(address, {})
+        self.displayed = None
+        self.mode = None
+        self.stats = {'writes': 0, 'responses': 0, 'bytes': 0, 'dropped': 0, 'refreshes': 0}
+        self._handler = None
+        self._queued = 0
+        self._pending = []
+        self._rejected = False
+
+    async def connect(self, **kwargs):
+        await asyncio.sleep(self.latency)
+        self.is_connected = True
+
+    async def disconnect(self):
+        self.is_connected = False
+        self._pending.clear()
+
+    async def start_notify(self, char_specifier, callback, **kwargs):
+        self._handler = callback
+
+    async def stop_notify(self, char_specifier):
+        self._handler = None
+
+    async def write_gatt_char(self, char_specifier, data, response=False):
+        if not self.is_connected:
+            raise EOFError("Simulated device is not connected")
+        if self.disconnect_rate and self.rng.random() < self.disconnect_rate:
+            await self.disconnect()
+            raise EOFError("Simulated disconnect")
+        self._queued += 1
+        if not response:
+            await asyncio.sleep(0)
+            if self.drop_rate and self.rng.random() < self.drop_rate:
+                self.stats['dropped'] += 1
+                return
+            self.stats['writes'] += 1
+            self.stats['bytes'] += len(data)
+            self._pending.append(bytes(data))
+            return
+        await asyncio.sleep(self.latency * self._queued)
+        self._queued = 0
+        self.stats['responses'] += 1
+        self.stats['writes'] += 1
+        self.stats['bytes'] += len(data)
+        for payload in (*self._pending, bytes(data)):
+            self._handle(payload)
+        self._pending.clear()
+        if self._rejected:
+            self._rejected = False
+            raise bleak.exc.BleakError("Simulated ATT error: continuation of a plane that was not started")
+
+    def _notify(self, data):
+        if self._handler: self._handler(CHARACTERISTIC_UUID, bytearray(data))
+
+    def _handle(self, payload):
+        cmd, body = payload[0], payload[1:]
+        if cmd == EpdCmd.INIT:
+            self.planes.clear() # INIT re-initialises the controller
+            config = bytearray(12)
+            config[7] = self.driver
+            loop = asyncio.get_running_loop()
+            loop.call_soon(self._notify, config)
+            loop.call_soon(self._notify, f"mtu={self.mtu}".encode('utf-8'))
+        elif cmd == EpdCmd.WRITE_IMG and body:
+            header, chunk = body[0], body[1:]
+            step = 'bw' if header & 0x0F == 0x0F else 'red'
+            if header & 0xF0 == 0: self.planes[step] = bytearray() # First chunk of a plane
+            elif step not in self.planes:
+                self._rejected = True
+                return
+            self.planes[step].extend(chunk)
+        elif cmd == EpdCmd.CLEAR:
+            self.planes.clear()
+        elif cmd == EpdCmd.REFRESH:
+            self.displayed = self.received_planes()
+            self.stats['refreshes'] += 1
+        elif cmd == EpdCmd.SET_TIME:
+            self.mode = body[-1] if body else None
+
+    def received_planes(self):
+        return tuple(bytes(self.planes[step]) for step in ('bw', 'red') if step in self.planes)
+
+SIMULATOR_OPTIONS = {'driver': ('driver', lambda v: int(v, 0)), 'mtu': ('mtu', int), 'latency': ('latency', float),
+                     'drop': ('drop_rate', float), 'disconnect': ('disconnect_rate', float), 'seed': ('seed', int)}
+
+def parse_simulator_spec(spec):
+    """Parses 'driver=0x04,mtu=247,latency=0.0075,drop=0,disconnect=0,seed=1' into SimulatedClient arguments."""
+    kwargs = {}
+    for part in filter(None, (part.strip() for part in spec.split(','))):
+        key, _, value = part.partition('=')
+        if key.strip() not in SIMULATOR_OPTIONS:
+            raise click.BadParameter(f"unknown simulator option {key.strip()!r}", param_hint='--simulate')
+        name, convert = SIMULATOR_OPTIONS[key.strip()]
+        try:
+            kwargs[name] = convert(value.strip())
+        except ValueError:
+            raise click.BadParameter(f"invalid value for {key.strip()!r}: {value.strip()!r}", param_hint='--simulate')
+    return kwargs
+
+# --- Benchmarks ---
+
+STARTUP_COMMANDS = (('--help',), ('clock', '--help'), ('scan', '--help'), ('cache', 'stats'))
+HEAVY_MODULES = ('numpy', 'PIL', 'bleak')
+
+def benchmark_image(width, height):
+    """Deterministic photo-like test pattern: gradients, a red band and noise."""
+    rng = np.random.default_rng(0)
+    y, x = np.mgrid[0:height, 0:width]
+    pixels = np.stack([x * 255.0 / width, y * 255.0 / height, (x + y) * 127.0 / (width + height)], axis=-1)
+    pixels[height // 3:height // 2, :, 0] = 255
+    pixels += rng.normal(0, 24, pixels.shape)
+    return Image.fromarray(np.clip(pixels, 0, 255).astype(np.uint8))
+
+def best_time(func, repeat):
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+def benchmark_startup(repeat):
+    """Times fresh processes running lightweight commands and lists the heavy modules each one imported."""
+    frozen = getattr(sys, 'frozen', False) # A PyInstaller build is its own interpreter
+    results = []
+    for args in STARTUP_COMMANDS:
+        if frozen:
+            command = [sys.executable, *args]
+        else:
+            command = [sys.executable, '-X', 'importtime', os.path.abspath(__file__), *args]
+        imported = set()
+
+        def run():
+            result = subprocess.run(command, capture_output=True, text=True, check=True)
+            imported.update(line.rsplit('|', 1)[-1].strip() for line in result.stderr.splitlines() if line.startswith('import time:'))
+
+        seconds = best_time(run, repeat)
+        heavy = None if frozen else [module for module in HEAVY_MODULES if module in imported]
+        logger.info(f"startup '{' '.join(args)}': {seconds:.3f}s, imports {', '.join(heavy or []) or 'none'}")
+        results.append({'command': ' '.join(args), 'seconds': seconds, 'imports': heavy})
+    return results
+
+async def benchmark_transfer(planes, driver, interleaved_count, flow_control, simulator_options):
+    session = DeviceSession('SIM')
+    session.client_class = functools.partial(SimulatedClient, driver=driver, **simulator_options)
+    await session.connect()
+    await session.handshake()
+    window = AdaptiveWindow(interleaved_count) if flow_control == 'adaptive' else None
+    start = time.perf_counter()
+    for step, plane in zip(('bw', 'red'), planes):
+        await write_image_data(session.client, plane, session.mtu_size, interleaved_count, step=step, window=window)
+    elapsed = time.perf_counter() - start
+    stats = session.client.stats
+    await session.close()
+    total = sum(len(plane) for plane in planes)
+    return {'seconds': elapsed, 'bytes': total, 'bytes_per_second': total / elapsed if elapsed else None,
+            'writes': stats['writes'], 'responses': stats['responses'], 'dropped': stats['dropped'],
+            'frame_ok': session.client.received_planes() == tuple(planes)}
+
+def run_benchmarks(dither_algos, repeat=3, interleaved_count=31, flow_control='adaptive', simulator_options=None, startup_only=False):
+    """Times startup of lightweight commands, then dither, pack and simulated transfer for every driver resolution and colour mode."""
+    startup = benchmark_startup(repeat)
+    results = []
+    for driver, (width, height) in ({} if startup_only else DRIVER_TO_RESOLUTION).items():
+        image = benchmark_image(width, height)
+        for color_mode in ('bw', 'bwr'):
+            palette = color_palette(color_mode)
+            entry = {'driver': f"0x{driver:02x}", 'width': width, 'height': height, 'color_mode': color_mode, 'dither': {}}
+            for algorithm in dither_algos:
+                entry['dither'][algorithm] = best_time(lambda: apply_dither(image, palette, algorithm), repeat)
+            dithered = apply_dither(image, palette, dither_algos[0]) if dither_algos else image
+            entry['pack'] = best_time(lambda: image_to_planes(dithered, color_mode), repeat)
+            planes = image_to_planes(dithered, color_mode)
+            entry['transfer'] = asyncio.run(benchmark_transfer(planes, driver, interleaved_count, flow_control, simulator_options or {}))
+            logger.info(f"0x{driver:02x} {width}x{height} {color_mode}: "
+                        + ", ".join(f"{name} {seconds:.3f}s" for name, seconds in entry['dither'].items())
+                        + f", pack {entry['pack']:.4f}s, transfer {entry['transfer']['seconds']:.3f}s")
+            results.append(entry)
+    return {
+        'meta': {'timestamp': int(time.time()), 'python': platform.python_version(), 'numpy': np.__version__,
+                 'pillow': Image.__version__, 'machine': platform.machine(), 'repeat': repeat,
+                 'flow_control': flow_control, 'interleaved_count': interleaved_count,
+                 'simulator': simulator_options or {}},
+        'startup': startup,
+        'results': results,
+    }
+
+# --- Daemon ---
+
+FRAME_JOBS = ('image', 'text', 'frame')
+SET_TIME_MODES = {'calendar': 1, 'clock': 2}
+
+class Job:
+    """One request received over the job socket; progress is streamed back as JSON lines."""
+
+    def __init__(self, request, writer):
+        self.request = request
+        self.kind = request.get('job')
+        self.writer = writer
+        self.done = asyncio.Event()
+
+    async def reply(self, status, **fields):
+        message = {'id': self.request.get('id'), 'address': self.request.get('address'), 'status': status, **fields}
+        try:
+            self.writer.write(json.dumps(message).encode('utf-8') + b'\n')
+            await self.writer.drain()
+        except (ConnectionError, RuntimeError):
+            pass # The caller went away; the job still runs
+
+    async def finish(self, status, **fields):
+        await self.reply(status, **fields)
+        self.done.set()
+
+class DeviceWorker:
+    """Keeps a warm connection to one device and runs its jobs in arrival order.
+
+    A new frame job supersedes any frame job still waiting, so a busy device
+    only receives the newest content. The connection is dropped after
+    idle_timeout seconds without jobs and re-established on demand.
+    """
+
+    def __init__(self, address, adapter, options, frame_cache, profiles, idle_timeout=None):
+        self.address = address
+        self.adapter = adapter
+        self.options = options
+        self.frame_cache = frame_cache
+        self.profiles = profiles
+        self.idle_timeout = idle_timeout
+        self.session = None
+        self.queue = collections.deque()
+        self.wakeup = asyncio.Event()
+        self.task = None
+
+    def start(self):
+        self.task = asyncio.create_task(self.run())
+
+    async def submit(self, job):
+        if job.kind in FRAME_JOBS:
+            for queued in [queued for queued in self.queue if queued.kind in FRAME_JOBS]:
+                self.queue.remove(queued)
+                await queued.finish('superseded', by=job.request.get('id'))
+        self.queue.append(job)
+        self.wakeup.set()
+        await job.reply('queued', position=len(self.queue))
+
+    async def ensure_connected(self):
+        if self.session and self.session.is_connected: return
+        self.session = DeviceSession(self.address, self.adapter, self.profiles)
+        logger.info(f"Connecting to {self.address} (adapter: {self.adapter or 'default'})...")
+        with span('connect'):
+            await self.session.connect()
+        logger.info(f"Connected to {self.session.client.address}")
+
+    async def disconnect(self):
+        if self.session:
+            try:
+                await self.session.close()
+            except Exception as e:
+                logger.warning(f"Error while disconnecting: {e}")
+            self.session = None
+
+    async def run(self):
+        current_device.set(self.address)
+        while True:
+            if not self.queue:
+                self.wakeup.clear()
+                try:
+                    await asyncio.wait_for(self.wakeup.wait(), timeout=self.idle_timeout)
+                except asyncio.TimeoutError:
+                    if self.session and self.session.is_connected:
+                        logger.info(f"Idle for {self.idle_timeout}s, disconnecting.")
+                        await self.disconnect()
+                continue
+            job = self.queue.popleft()
+            await job.reply('started')
+            metrics = RunMetrics(self.address, self.adapter)
+            current_metrics.set(metrics)
+            start = time.monotonic()
+            try:
+                status = await self.execute(job)
+                metrics.ok = True
+            except Exception as e:
+                logger.error(f"Job {job.kind} failed: {e}")
+                metrics.ok = False
+                metrics.seconds = time.monotonic() - start
+                await job.finish('failed', error=str(e), elapsed=round(metrics.seconds, 3), metrics=metrics.to_dict())
+            else:
+                metrics.seconds = time.monotonic() - start
+                await job.finish(status, elapsed=round(metrics.seconds, 3), metrics=metrics.to_dict())
+
+    async def execute(self, job):
+        retry = self.options['retry']
+        checkpoint = TransferCheckpoint() if self.options.get('resume') else None
+        for attempt in range(retry + 1):
+            try:
+                await self.ensure_connected()
+                return await self.run_job(job.request, checkpoint)
+            except connection_errors() as e:
+                logger.error(f"A connection error occurred: {e}")
+                await self.disconnect()
+                if attempt == retry: raise
+                delay = backoff_delay(attempt, self.options['retry_delay'], self.options['retry_max_delay'])
+                await job.reply('retrying', delay=round(delay, 1))
+                count('retries')
+                with span('backoff'):
+                    await asyncio.sleep(delay)
+
+    async def run_job(self, request, checkpoint=None):
+        """Runs one job on the connected session and returns its final status."""
+        client = self.session.client
+        if request['job'] == 'set_time':
+            await set_time(client, SET_TIME_MODES[request.get('mode', 'clock')])
+            self.profiles.forget_frame(self.address)
+            return 'done'
+        if request['job'] == 'clear':
+            await clear_screen(client)
+            await asyncio.sleep(1) # Give time for command to process
+            self.profiles.forget_frame(self.address)
+            return 'done'
+
+        options = {**self.options, **{DEVICE_OVERRIDES[key]: value for key, value in request.items() if key in DEVICE_OVERRIDES}}
+        resumed = checkpoint is not None and checkpoint.resumable
+        with span('handshake'):
+            if resumed: await self.session.resume(checkpoint)
+            else: await self.session.handshake()
+        width, height = options.get('width'), options.get('height')
+        if width is None and height is None:
+            if not self.session.resolution:
+                raise ValueError("Resolution could not be determined; pass width and height.")
+            width, height = self.session.resolution
+
+        if request['job'] == 'frame' and options.get('frame_path'):
+            frame_width, frame_height, _, planes = load_frame_file(options['frame_path'])
+            if (frame_width, frame_height) != (width, height):
+                raise ValueError(f"Frame file is {frame_width}x{frame_height} but the device is {width}x{height}.")
+        elif request['job'] == 'frame':
+            epd_data = base64.b64decode(request['data'])
+            planes = split_planes(epd_data, options['color_mode'])
+            expected = (width + 7) // 8 * height
+            if any(len(plane) != expected for plane in planes):
+                raise ValueError(f"Frame size does not match {width}x{height} {options['color_mode']}.")
+        elif request['job'] == 'text' and request.get('fields') is not None:
+            template = compile_template(options['text'], options['font'], options['size'], options['color'], options['bg_color'])
+            planes = await asyncio.to_thread(template.render_planes, width, height, request['fields'],
+                                             options['color_mode'], options['dither_algo'])
+        else:
+            image_path = options['image_path'] if request['job'] == 'image' else None
+            planes = await asyncio.to_thread(
+                render_frame, image_path, options.get('text') if image_path is None else None, width, height,
+                options['font'], options['size'], options['color'], options['bg_color'], options['color_mode'],
+                options['dither_algo'], options['resize_mode'], frame_cache=self.frame_cache)
+        digest = frame_digest(planes, (width, height))
+        profile = self.profiles.get(self.address) or {}
+        if not request.get('force') and not request.get('clear') and profile.get('frame_digest') == digest:
+            logger.info("The device already shows this frame, skipping.")
+            count('frames_skipped')
+            return 'unchanged'
+        count_uniform_planes(planes, width)
+        if checkpoint: checkpoint.use_for(digest)
+        await send_frame(self.session, planes, options['interleaved_count'], request.get('clear', False), options['flow_control'],
+                         checkpoint, resumed)
+        self.session.reconcile_profile()
+        self.profiles.update(self.address, frame_digest=digest)
+        return 'done'
+
+def validate_job(request):
+    """Returns an error message for a malformed job request, or None."""
+    if not isinstance(request, dict): return "request must be a JSON object"
+    if not request.get('address'): return "missing 'address'"
+    kind = request.get('job')
+    if kind not in (*FRAME_JOBS, 'clear', 'set_time'): return f"unknown job {kind!r}"
+    if kind == 'image' and not request.get('image'): return "image job needs 'image'"
+    if kind == 'text' and not request.get('text'): return "text job needs 'text'"
+    if kind == 'text' and not isinstance(request.get('fields', {}), dict): return "fields must be a JSON object"
+    if kind == 'frame' and not request.get('data') and not request.get('frame'): return "frame job needs base64 'data' or a 'frame' file"
+    if kind == 'set_time' and request.get('mode', 'clock') not in SET_TIME_MODES: return "mode must be 'clock' or 'calendar'"
+    return None
+
+def parse_listen_address(listen):
+    """Splits HOST:PORT and rejects hosts that are not loopback. Jobs name local files
+    and the socket has no authentication, so it must not be reachable from other machines."""
+    host, _, port = listen.rpartition(':')
+    host = host.strip('[]')
+    if not host or not port.isdigit():
+        raise ValueError(f"expected HOST:PORT, got {listen!r}")
+    if host != 'localhost':
+        try:
+            loopback = ipaddress.ip_address(host).is_loopback
+        except ValueError:
+            loopback = False
+        if not loopback:
+            raise ValueError(f"{host} is not a loopback address; use 127.0.0.1, ::1 or localhost")
+    return host, int(port)
+
+async def serve_jobs(addresses, adapters, socket_path, listen, idle_timeout, options, use_cache=True):
+    """Accepts JSON-line jobs on a Unix socket (or localhost TCP) and dispatches them to per-device workers."""
+    adapters = list(adapters) or [None]
+    frame_cache = FrameCache(persist=use_cache)
+    profiles = DeviceProfiles()
+    workers = {}
+
+    def worker_for(address):
+        key = address.upper()
+        if key not in workers:
+            workers[key] = DeviceWorker(address, adapters[len(workers) % len(adapters)], options, frame_cache, profiles, idle_timeout)
+            workers[key].start()
+        return workers[key]
+
+    async def handle_client(reader, writer):
+        jobs = []
+        while True:
+            try:
+                line = await reader.readline()
+            except (ValueError, asyncio.LimitOverrunError):
+                # The rest of the oversized line cannot be told apart from the next job, so stop reading.
+                await Job({}, writer).finish('rejected', error=f"job is longer than {JOB_LINE_LIMIT} bytes")
+                break
+            if not line: break
+            if not line.strip(): continue
+            try:
+                request = json.loads(line)
+            except ValueError as e:
+                request, error = {}, f"invalid JSON: {e}"
+            else:
+                error = validate_job(request)
+            job = Job(request, writer)
+            if error:
+                await job.finish('rejected', error=error)
+                continue
+            jobs.append(job)
+            await worker_for(request['address']).submit(job)
+        # The caller may half-close after sending; keep streaming until its jobs finish.
+        await asyncio.gather(*(job.done.wait() for job in jobs))
+        writer.close()
+
+    for address in addresses:
+        worker = worker_for(address)
+        # Warm up the connection in the background; failures are retried on the first job.
+        async def warm_up(worker=worker):
+            current_device.set(worker.address)
+            try:
+                await worker.ensure_connected()
+            except Exception as e:
+                logger.warning(f"Could not pre-connect: {e}")
+        asyncio.create_task(warm_up())
+
+    if listen:
+        host, port = parse_listen_address(listen)
+        server = await asyncio.start_server(handle_client, host, port, limit=JOB_LINE_LIMIT)
+        logger.info(f"Listening for jobs on {listen}")
+    else:
+        os.makedirs(os.path.dirname(socket_path), exist_ok=True)
+        if os.path.exists(socket_path): os.remove(socket_path)
+        server = await asyncio.start_unix_server(handle_client, path=socket_path, limit=JOB_LINE_LIMIT)
+        os.chmod(socket_path, 0o600)
+        logger.info(f"Listening for jobs on {socket_path}")
+    try:
+        async with server:
+            await server.serve_forever()
+    finally:
+        for worker in workers.values():
+            worker.task.cancel()
+            await worker.disconnect()
 
 # --- CLI Definition ---
 
 @click.group()
-def cli(): pass
+@click.option('--simulate', is_flag=False, flag_value='', default=None, metavar='[KEY=VALUE,...]',
+              help='Talk to a simulated device instead of BLE, e.g. --simulate driver=0x01,latency=0.0075,drop=0.01.')
+def cli(simulate):
+    if simulate is not None:
+        DeviceSession.client_class = functools.partial(SimulatedClient, **parse_simulator_spec(simulate))
 
 @cli.command()
 @click.option('--adapter', help='Bluetooth adapter to use, e.g., hci0')
-def scan(adapter):
+@click.option('--timeout', default=SCAN_TIMEOUT, type=float, show_default=True, help='Seconds to scan for.')
+@click.option('--epd-only', is_flag=True, help='Only list devices advertising the display service.')
+@click.option('--address', 'addresses', multiple=True, help='Stop as soon as this device has been seen. Repeat for several devices.')
+def scan(adapter, timeout, epd_only, addresses):
     """Scan for BLE devices."""
-    asyncio.run(BleakScanner.discover(adapter=adapter))
+    missing = asyncio.run(scan_devices(adapter, timeout, epd_only, addresses))
+    if missing:
+        logger.error(f"Not found: {', '.join(sorted(missing))}")
+        sys.exit(1)
+
+def device_options(func):
+    """Target options shared by every device command."""
+    func = click.option('--metrics-prom', type=click.Path(dir_okay=False), help='Write per-device metrics for the Prometheus node_exporter textfile collector.')(func)
+    func = click.option('--metrics-json', type=click.Path(dir_okay=False), help='Write per-phase timings and counters per device as JSON.')(func)
+    func = click.option('--concurrency', default=2, type=int, show_default=True, help='Maximum simultaneous connections per adapter.')(func)
+    func = click.option('--adapter', 'adapters', multiple=True, help='Bluetooth adapter to use, e.g., hci0. Repeat to spread devices over several adapters.')(func)
+    func = click.option('--address-file', type=click.Path(exists=True, dir_okay=False), help='File with one address, or one JSON object with per-device options, per line.')(func)
+    func = click.option('--address', 'addresses', multiple=True, help='BLE address of the target device. Repeat for several devices.')(func)
+    return func
+
+def run_devices(addresses, address_file, adapters, concurrency, metrics_json=None, metrics_prom=None, **kwargs):
+    jobs = [(address, {}) for address in addresses]
+    if address_file: jobs.extend(load_device_list(address_file))
+    if not jobs: raise click.UsageError("Provide --address or --address-file.")
+    if concurrency < 1: raise click.BadParameter("must be at least 1", param_hint='--concurrency')
+    if 'command_to_run' not in kwargs:
+        for address, overrides in jobs:
+            if not any({**kwargs, **overrides}.get(key) for key in CONTENT_KEYS):
+                raise click.UsageError(f"One of --image, --text or --frame must be provided (missing for {address}).")
+    runs = asyncio.run(fan_out(jobs, adapters, concurrency, **kwargs))
+    export_metrics(runs, click.get_current_context().info_name, metrics_json, metrics_prom)
+    if not all(run.ok for run in runs):
+        sys.exit(1)
 
 @cli.command()
-@click.option('--address', required=True)
-@click.option('--adapter')
-def calendar(address, adapter):
+@device_options
+def calendar(addresses, address_file, adapters, concurrency, metrics_json, metrics_prom):
     """Switch the device to calendar mode."""
-    asyncio.run(main_logic(address, adapter, command_to_run='set_time', mode_byte=1))
+    run_devices(addresses, address_file, adapters, concurrency, metrics_json, metrics_prom, command_to_run='set_time', mode_byte=1)
 
 @cli.command()
-@click.option('--address', required=True)
-@click.option('--adapter')
-def clock(address, adapter):
+@device_options
+def clock(addresses, address_file, adapters, concurrency, metrics_json, metrics_prom):
     """Switch the device to clock mode."""
-    asyncio.run(main_logic(address, adapter, command_to_run='set_time', mode_byte=2))
+    run_devices(addresses, address_file, adapters, concurrency, metrics_json, metrics_prom, command_to_run='set_time', mode_byte=2)
 
 @cli.command()
-@click.option('--address', required=True)
-@click.option('--adapter')
-def clear(address, adapter):
+@device_options
+def clear(addresses, address_file, adapters, concurrency, metrics_json, metrics_prom):
     """Clear the device screen."""
-    asyncio.run(main_logic(address, adapter, command_to_run='clear_screen'))
+    run_devices(addresses, address_file, adapters, concurrency, metrics_json, metrics_prom, command_to_run='clear_screen')
 
 @cli.command()
-@click.option('--address', required=True)
-@click.option('--adapter')
+@device_options
 @click.option('--image', 'image_path', type=click.Path(exists=True))
 @click.option('--text')
-@click.option('--font', default='/usr/share/fonts/truetype/dejavu/DejaVuSans.ttf', help='Default font path.')
+@click.option('--frame', 'frame_path', type=click.Path(exists=True, dir_okay=False), help='Send a frame file written by prepare, without rendering.')
+@click.option('--font', default=DEFAULT_FONT, help='Default font path.')
 @click.option('--size', default=24, help='Default font size.')
 @click.option('--color', default='black', help='Default text color (black, red, or white).')
 @click.option('--bg-color', type=click.Choice(['white', 'black', 'red']), default='white', help='Set the background color for text rendering.')
@@ -433,15 +2303,125 @@ def clear(address, adapter):
 @click.option('--height', type=int)
 @click.option('--clear', is_flag=True)
 @click.option('--color-mode', type=click.Choice(['bw', 'bwr']), default='bw')
-@click.option('--dither', 'dither_algo', type=click.Choice(['auto', 'none', 'floyd', 'atkinson', 'jarvis', 'stucki', 'bayer']), default='auto', help="Dithering algorithm. 'auto' enables for images, disables for text.")
+@click.option('--dither', 'dither_algo', type=click.Choice(['auto', 'none', *ERROR_DIFFUSION_MATRICES, *ORDERED_DITHER_MATRICES]), default='auto', help="Dithering algorithm. 'auto' enables for images, disables for text.")
 @click.option('--resize-mode', type=click.Choice(['stretch', 'fit', 'crop']), default='stretch')
-@click.option('--interleaved-count', default=31, type=int, help='Number of chunks to send before waiting for a response.')
+@click.option('--interleaved-count', default=31, type=int, help='Number of chunks to send before waiting for a response (initial window in adaptive mode).')
+@click.option('--flow-control', type=click.Choice(['adaptive', 'static']), default='adaptive', help="'adaptive' sizes the window from acknowledgement round trips; 'static' always uses --interleaved-count.")
 @click.option('--retry', default=3, type=int, help='Max number of retry attempts on connection failure.')
+@click.option('--retry-delay', default=RETRY_BASE_DELAY, type=float, show_default=True, help='Delay before the first retry; it doubles on each further retry, with jitter.')
+@click.option('--retry-max-delay', default=RETRY_MAX_DELAY, type=float, show_default=True, help='Upper bound for the retry delay.')
+@click.option('--resume', is_flag=True, help='After a dropped connection, reconnect without INIT and continue from the last acknowledged chunk; the whole frame is sent if the device rejects that.')
 @click.option('--save', 'save_path', type=click.Path(), help='Save the final dithered image to the specified path.')
-def send(address, adapter, image_path, text, font, size, color, bg_color, width, height, clear, color_mode, dither_algo, resize_mode, interleaved_count, retry, save_path):
-    """Send an image or text to the device."""
-    if not image_path and not text: raise click.UsageError("Either --image or --text must be provided.")
-    asyncio.run(main_logic(address, adapter, image_path, text, font, size, color, bg_color, width, height, clear, color_mode, dither_algo, resize_mode, interleaved_count, retry, save_path=save_path))
+@click.option('--no-cache', is_flag=True, help='Always re-render instead of using the frame cache.')
+@click.option('--no-profile', is_flag=True, help='Ignore the stored device profile and wait for the full config/MTU handshake.')
+@click.option('--force', is_flag=True, help='Send even if the device already shows this frame.')
+def send(addresses, address_file, adapters, concurrency, metrics_json, metrics_prom, image_path, text, frame_path, font, size, color, bg_color, width, height, clear, color_mode, dither_algo, resize_mode, interleaved_count, flow_control, retry, retry_delay, retry_max_delay, resume, save_path, no_cache, no_profile, force):
+    """Send an image or text to one or more devices."""
+    run_devices(addresses, address_file, adapters, concurrency, metrics_json, metrics_prom, image_path=image_path, text=text, frame_path=frame_path, font=font, size=size,
+                color=color, bg_color=bg_color, width=width, height=height, clear=clear, color_mode=color_mode,
+                dither_algo=dither_algo, resize_mode=resize_mode, interleaved_count=interleaved_count, flow_control=flow_control, retry=retry,
+                retry_delay=retry_delay, retry_max_delay=retry_max_delay, resume=resume,
+                save_path=save_path, use_cache=not no_cache, use_profile=not no_profile, force=force)
+
+@cli.command()
+@click.argument('source', type=click.Path(exists=True))
+@click.option('--output', 'output_dir', required=True, type=click.Path(file_okay=False), help='Directory to write the frame files to.')
+@click.option('--font', default=DEFAULT_FONT, help='Default font path.')
+@click.option('--size', default=24, help='Default font size.')
+@click.option('--color', default='black', help='Default text color (black, red, or white).')
+@click.option('--bg-color', type=click.Choice(['white', 'black', 'red']), default='white', help='Set the background color for text rendering.')
+@click.option('--width', type=int)
+@click.option('--height', type=int)
+@click.option('--color-mode', type=click.Choice(['bw', 'bwr']), default='bw')
+@click.option('--dither', 'dither_algo', type=click.Choice(['auto', 'none', *ERROR_DIFFUSION_MATRICES, *ORDERED_DITHER_MATRICES]), default='auto', help="Dithering algorithm. 'auto' enables for images, disables for text.")
+@click.option('--resize-mode', type=click.Choice(['stretch', 'fit', 'crop']), default='stretch')
+@click.option('--jobs', 'workers', type=int, help='Worker processes (default: one per CPU).')
+@click.option('--no-cache', is_flag=True, help='Always re-render instead of using the frame cache.')
+def prepare(source, output_dir, font, size, color, bg_color, width, height, color_mode, dither_algo, resize_mode, workers, no_cache):
+    """Render a directory of images or a JSON-lines manifest to frame files for send --frame."""
+    if workers is not None and workers < 1: raise click.BadParameter("must be at least 1", param_hint='--jobs')
+    defaults = {'font': font, 'size': size, 'color': color, 'bg_color': bg_color, 'width': width, 'height': height,
+                'color_mode': color_mode, 'dither_algo': dither_algo, 'resize_mode': resize_mode}
+    jobs = load_prepare_jobs(source, defaults)
+    if not jobs: raise click.UsageError(f"Nothing to prepare in {source}.")
+    if prepare_frames(jobs, output_dir, workers, use_cache=not no_cache):
+        sys.exit(1)
+
+@cli.command()
+@click.option('--address', 'addresses', multiple=True, help='Device to keep a warm connection to. Repeat for several devices.')
+@click.option('--address-file', type=click.Path(exists=True, dir_okay=False), help='File with one address per line to keep warm.')
+@click.option('--adapter', 'adapters', multiple=True, help='Bluetooth adapter to use, e.g., hci0. Repeat to spread devices over several adapters.')
+@click.option('--socket', 'socket_path', default=DEFAULT_SOCKET_PATH, show_default=True, type=click.Path(), help='Unix socket to accept jobs on.')
+@click.option('--listen', help='Accept jobs on HOST:PORT over TCP instead of the Unix socket. HOST must be a loopback address.')
+@click.option('--idle-timeout', type=float, help='Disconnect from a device after this many idle seconds (default: stay connected).')
+@click.option('--font', default=DEFAULT_FONT, help='Default font path.')
+@click.option('--size', default=24, help='Default font size.')
+@click.option('--color-mode', type=click.Choice(['bw', 'bwr']), default='bw', help='Default color mode.')
+@click.option('--dither', 'dither_algo', type=click.Choice(['auto', 'none', *ERROR_DIFFUSION_MATRICES, *ORDERED_DITHER_MATRICES]), default='auto', help='Default dithering algorithm.')
+@click.option('--interleaved-count', default=31, type=int, help='Number of chunks to send before waiting for a response (initial window in adaptive mode).')
+@click.option('--flow-control', type=click.Choice(['adaptive', 'static']), default='adaptive', help="'adaptive' sizes the window from acknowledgement round trips; 'static' always uses --interleaved-count.")
+@click.option('--retry', default=3, type=int, help='Max number of retry attempts on connection failure.')
+@click.option('--retry-delay', default=RETRY_BASE_DELAY, type=float, show_default=True, help='Delay before the first retry; it doubles on each further retry, with jitter.')
+@click.option('--retry-max-delay', default=RETRY_MAX_DELAY, type=float, show_default=True, help='Upper bound for the retry delay.')
+@click.option('--resume', is_flag=True, help='After a dropped connection, reconnect without INIT and continue from the last acknowledged chunk; the whole frame is sent if the device rejects that.')
+@click.option('--no-cache', is_flag=True, help='Keep rendered frames in memory only.')
+def serve(addresses, address_file, adapters, socket_path, listen, idle_timeout, font, size, color_mode, dither_algo, interleaved_count, flow_control, retry, retry_delay, retry_max_delay, resume, no_cache):
+    """Keep devices connected and run jobs received over a local socket."""
+    if listen:
+        try:
+            parse_listen_address(listen)
+        except ValueError as e:
+            raise click.BadParameter(str(e), param_hint='--listen')
+    addresses = list(addresses)
+    if address_file: addresses.extend(address for address, _ in load_device_list(address_file))
+    options = {'font': font, 'size': size, 'color': 'black', 'bg_color': 'white', 'width': None, 'height': None,
+               'color_mode': color_mode, 'dither_algo': dither_algo, 'resize_mode': 'stretch',
+               'interleaved_count': interleaved_count, 'flow_control': flow_control, 'retry': retry,
+               'retry_delay': retry_delay, 'retry_max_delay': retry_max_delay, 'resume': resume}
+    try:
+        asyncio.run(serve_jobs(addresses, adapters, socket_path, listen, idle_timeout, options, use_cache=not no_cache))
+    except KeyboardInterrupt:
+        logger.info("Shutting down.")
+
+@cli.command()
+@click.option('--dither', 'dither_algos', multiple=True, type=click.Choice([*ERROR_DIFFUSION_MATRICES, *ORDERED_DITHER_MATRICES]), help='Dithering algorithms to time (default: floyd and bluenoise). The first one feeds pack and transfer.')
+@click.option('--repeat', default=3, type=int, show_default=True, help='Runs per measurement; the fastest is reported.')
+@click.option('--interleaved-count', default=31, type=int, help='Number of chunks to send before waiting for a response.')
+@click.option('--flow-control', type=click.Choice(['adaptive', 'static']), default='adaptive')
+@click.option('--simulate', 'simulator_spec', default='latency=0.0075', metavar='KEY=VALUE,...', show_default=True, help='Simulated device options for the transfer step (latency=0 times only the sender).')
+@click.option('--startup-only', is_flag=True, help='Only time the startup of lightweight commands.')
+@click.option('--output', type=click.Path(dir_okay=False, writable=True), help='Write the JSON results here instead of stdout.')
+def bench(dither_algos, repeat, interleaved_count, flow_control, simulator_spec, startup_only, output):
+    """Benchmark startup, dither, pack and simulated transfer for every driver resolution."""
+    report = run_benchmarks(list(dither_algos or ('floyd', 'bluenoise')), repeat, interleaved_count, flow_control,
+                            parse_simulator_spec(simulator_spec), startup_only)
+    if output:
+        with open(output, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2)
+        logger.info(f"Wrote benchmark results to {output}")
+    else:
+        click.echo(json.dumps(report, indent=2))
+
+@cli.group()
+def cache():
+    """Inspect or prune the rendered frame cache."""
+
+@cache.command()
+def stats():
+    """Show frame cache location and usage."""
+    info = FrameCache().stats()
+    click.echo(f"Directory: {info['directory']}")
+    click.echo(f"Entries:   {info['entries']}")
+    click.echo(f"Size:      {info['bytes'] / 1024 / 1024:.1f} MB of {info['max_bytes'] / 1024 / 1024:.0f} MB")
+
+@cache.command()
+@click.option('--max-size', type=float, default=0, help='Evict least recently used frames until the cache is at most this many MB (0 empties it).')
+def prune(max_size):
+    """Evict frames from the cache."""
+    removed, freed = FrameCache().prune(int(max_size * 1024 * 1024))
+    click.echo(f"Removed {removed} frames ({freed / 1024:.1f} KB).")
 
 if __name__ == '__main__':
+    import multiprocessing # Not at the top: it would add to every command's startup
+    multiprocessing.freeze_support() # prepare's worker processes re-run this module in frozen builds
     cli()
\ No newline at end of file
@@ -0,0 +1,29 @@
+import main
+
+def test_grows_while_round_trips_stay_near_baseline():
+    window = main.AdaptiveWindow(4)
+    for _ in range(10):
+        assert window.on_ack(0.04, 4) == 0
+    assert window.size == 14
+
+def test_halves_and_pauses_when_round_trips_climb():
+    window = main.AdaptiveWindow(8)
+    window.on_ack(0.08, 8)
+    assert window.on_ack(0.08 * 3, 8) == main.STATIC_ACK_DELAY
+    assert window.size == 4
+
+def test_one_fast_ack_does_not_pin_the_baseline():
+    window = main.AdaptiveWindow(8)
+    window.on_ack(0.0001, 8) # Spuriously fast
+    for _ in range(main.AdaptiveWindow.BASELINE_SAMPLES):
+        window.on_ack(0.08, 8)
+    size = window.size
+    assert window.on_ack(0.08, 8) == 0
+    assert window.size == size + 1
+
+def test_no_pause_at_minimum_window():
+    window = main.AdaptiveWindow(2)
+    window.on_ack(0.02, 2)
+    window.size = 1
+    assert window.on_ack(0.1, 1) == 0
+    assert window.size == 1
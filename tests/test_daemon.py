@@ -0,0 +1,56 @@
+import asyncio
+import base64
+import functools
+import json
+import os
+
+import main
+
+real_sleep = asyncio.sleep
+
+OPTIONS = {'font': main.DEFAULT_FONT, 'size': 20, 'color': 'black', 'bg_color': 'white', 'width': None, 'height': None,
+           'color_mode': 'bwr', 'dither_algo': 'auto', 'resize_mode': 'stretch', 'interleaved_count': 31, 'retry': 0,
+           'retry_delay': 0, 'retry_max_delay': 0, 'flow_control': 'adaptive'}
+
+async def fast_sleep(delay, *args):
+    await real_sleep(0)
+
+async def send_jobs(socket_path, lines):
+    server = asyncio.create_task(main.serve_jobs([], [None], socket_path, None, None, OPTIONS))
+    while not os.path.exists(socket_path):
+        await real_sleep(0.01)
+    try:
+        reader, writer = await asyncio.open_unix_connection(socket_path)
+        for line in lines:
+            writer.write(line + b'\n')
+        writer.write_eof()
+        return [json.loads(reply) for reply in (await reader.read()).splitlines()]
+    finally:
+        server.cancel()
+        await asyncio.gather(server, return_exceptions=True)
+
+def simulate(monkeypatch, tmp_path):
+    clients = []
+    class Client(main.SimulatedClient):
+        def __init__(self, *args, **kwargs):
+            super().__init__(*args, **kwargs)
+            clients.append(self)
+    monkeypatch.setattr(main, 'CACHE_DIR', str(tmp_path))
+    monkeypatch.setattr(main.SimulatedClient, 'memory', {})
+    monkeypatch.setattr(main.DeviceSession, 'client_class', functools.partial(Client, driver=0x04))
+    monkeypatch.setattr(asyncio, 'sleep', fast_sleep)
+    return clients
+
+def test_full_size_frame_job(monkeypatch, tmp_path):
+    clients = simulate(monkeypatch, tmp_path)
+    planes = ((bytes(range(256)) * 188)[:48000], (bytes(reversed(range(256))) * 188)[:48000]) # 800x480 bwr, 128 KB in base64
+    job = {'id': 1, 'address': 'AA:01', 'job': 'frame', 'data': base64.b64encode(b''.join(planes)).decode()}
+    replies = asyncio.run(send_jobs(str(tmp_path / 'jobs.sock'), [json.dumps(job).encode()]))
+    assert replies[-1]['status'] == 'done', replies[-1]
+    assert clients[-1].displayed == planes
+
+def test_oversized_job_is_rejected(monkeypatch, tmp_path):
+    simulate(monkeypatch, tmp_path)
+    job = {'id': 1, 'address': 'AA:01', 'job': 'frame', 'data': 'A' * main.JOB_LINE_LIMIT}
+    replies = asyncio.run(send_jobs(str(tmp_path / 'jobs.sock'), [json.dumps(job).encode()]))
+    assert [reply['status'] for reply in replies] == ['rejected']
@@ -0,0 +1,28 @@
+import hashlib
+
+import numpy as np
+import pytest
+from PIL import Image
+
+import main
+
+@pytest.fixture
+def photo(tmp_path):
+    path = tmp_path / 'photo.png'
+    rng = np.random.default_rng(0)
+    Image.fromarray(rng.integers(0, 256, (600, 1000, 3), dtype=np.uint8)).save(path)
+    return path
+
+def test_file_digest_matches_whole_file_hash(photo):
+    assert main.file_digest(str(photo), chunk_size=4096) == hashlib.sha256(photo.read_bytes()).hexdigest()
+
+def test_decode_reduces_large_images(photo):
+    image = main.decode_image(str(photo), 100, 60)
+    assert image.size == (200, 120) # Reduced by 5, to twice the target
+
+@pytest.mark.parametrize('content', [b'not an image', 'truncated'])
+def test_decode_errors_name_the_file(photo, tmp_path, content):
+    path = tmp_path / 'broken.png'
+    path.write_bytes(photo.read_bytes()[:5000] if content == 'truncated' else content)
+    with pytest.raises(OSError, match=str(path)):
+        main.decode_image(str(path), 100, 60)
@@ -0,0 +1,54 @@
+import numpy as np
+import pytest
+from PIL import Image
+
+import main
+
+def reference_dither(image, palette, algorithm):
+    """The original per-pixel error-diffusion loop, kept as the reference output."""
+    palette = np.asarray(palette)
+    img_array = np.array(image.convert('RGB'), dtype=np.float32)
+    height, width, _ = img_array.shape
+    matrix, divisor = main.ERROR_DIFFUSION_MATRICES[algorithm]
+    matrix_h, matrix_w = len(matrix), len(matrix[0])
+    center_x = matrix_w // 2
+
+    for y in range(height):
+        for x in range(width):
+            old_pixel = img_array[y, x].copy()
+            new_pixel = palette[np.argmin(np.sqrt(np.sum((palette - old_pixel)**2, axis=1)))]
+            img_array[y, x] = new_pixel
+            quant_error = old_pixel - new_pixel
+
+            for my in range(matrix_h):
+                for mx in range(matrix_w):
+                    if matrix[my][mx] == 0: continue
+                    px, py = x + mx - center_x, y + my
+                    if 0 <= px < width and 0 <= py < height:
+                        img_array[py, px] += quant_error * matrix[my][mx] / divisor
+
+    return Image.fromarray(np.clip(img_array, 0, 255).astype(np.uint8))
+
+def make_image(width, height):
+    rng = np.random.default_rng(width * 1000 + height)
+    return Image.fromarray(rng.integers(0, 256, (height, width, 3), dtype=np.uint8))
+
+@pytest.mark.parametrize('size', [(1, 1), (5, 1), (3, 40), (37, 23)])
+@pytest.mark.parametrize('palette', [main.TWO_COLOR_PALETTE, main.THREE_COLOR_PALETTE], ids=['bw', 'bwr'])
+@pytest.mark.parametrize('algorithm', ['floyd', 'jarvis', 'stucki', 'atkinson'])
+def test_dither_matches_reference(algorithm, palette, size):
+    image = make_image(*size)
+    assert main.dither(image, palette, algorithm).tobytes() == reference_dither(image, palette, algorithm).tobytes()
+
+def test_blue_noise_matrix_is_cached_on_disk(tmp_path, monkeypatch):
+    monkeypatch.setattr(main, 'CACHE_DIR', str(tmp_path))
+    main.blue_noise_matrix.cache_clear()
+    try:
+        generated = main.blue_noise_matrix(16)
+        assert sorted(generated.ravel()) == list(range(16 * 16))
+        assert (tmp_path / 'bluenoise-16-1.5.npy').exists()
+        main.blue_noise_matrix.cache_clear()
+        monkeypatch.setattr(main, 'generate_blue_noise_matrix', None) # Must not be called again
+        assert np.array_equal(main.blue_noise_matrix(16), generated)
+    finally:
+        main.blue_noise_matrix.cache_clear()
@@ -0,0 +1,17 @@
+import asyncio
+import logging
+
+import main
+
+def test_unreadable_image_fails_with_one_line_error(tmp_path, monkeypatch, caplog):
+    monkeypatch.setattr(main, 'CACHE_DIR', str(tmp_path))
+    (tmp_path / 'junk.png').write_bytes(b'not an image')
+    jobs = [('AA:01', {'image_path': str(tmp_path / 'missing.png')}), ('AA:02', {'image_path': str(tmp_path / 'junk.png')})]
+    with caplog.at_level(logging.ERROR, logger='main'):
+        runs = asyncio.run(main.fan_out(jobs, [None], 1, width=250, height=122, retry=0))
+    assert [run.ok for run in runs] == [False, False]
+    errors = [record for record in caplog.records if record.levelno >= logging.ERROR]
+    assert len(errors) == 2
+    for record, (_, overrides) in zip(errors, jobs):
+        assert f"Cannot read image {overrides['image_path']}" in record.getMessage()
+        assert record.exc_info is None
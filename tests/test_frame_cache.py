@@ -0,0 +1,85 @@
+import os
+import threading
+import time
+
+import pytest
+
+import main
+
+def test_memory_layer_is_bounded_and_lru():
+    cache = main.FrameCache(persist=False, max_memory_bytes=250)
+    for key in 'abc':
+        cache.put(key, bytes(100))
+    assert cache.get('a') is None # Evicted to stay under 250 bytes
+    cache.get('b') # Now most recently used
+    cache.put('d', bytes(100))
+    assert cache.get('c') is None
+    assert cache.get('b') is not None and cache.get('d') is not None
+
+def test_locks_are_dropped_when_released():
+    cache = main.FrameCache(persist=False)
+    with cache.lock('a'):
+        assert 'a' in cache._locks
+    assert not cache._locks
+
+def test_lock_serialises_same_key():
+    cache = main.FrameCache(persist=False)
+    order = []
+
+    def other():
+        with cache.lock('a'):
+            order.append('other')
+
+    with cache.lock('a'):
+        thread = threading.Thread(target=other)
+        thread.start()
+        thread.join(0.1)
+        order.append('first')
+    thread.join()
+    assert order == ['first', 'other']
+    assert not cache._locks
+
+def test_listen_address_accepts_loopback():
+    assert main.parse_listen_address('127.0.0.1:8765') == ('127.0.0.1', 8765)
+    assert main.parse_listen_address('[::1]:8765') == ('::1', 8765)
+    assert main.parse_listen_address('localhost:1') == ('localhost', 1)
+
+@pytest.mark.parametrize('listen', ['0.0.0.0:8765', '192.168.1.5:8765', 'example.com:80', '127.0.0.1', ':80'])
+def test_listen_address_rejects_other_hosts(listen):
+    with pytest.raises(ValueError):
+        main.parse_listen_address(listen)
+
+def age(cache, key, seconds_ago):
+    path = cache._path(key)
+    then = time.time() - seconds_ago
+    os.utime(path, (then, then))
+
+def test_disk_lru_evicts_least_recently_read(tmp_path):
+    cache = main.FrameCache(str(tmp_path), max_bytes=250)
+    cache.put('a', bytes(100)); age(cache, 'a', 30)
+    cache.put('b', bytes(100)); age(cache, 'b', 20)
+    assert main.FrameCache(str(tmp_path)).get('a') == bytes(100) # Refreshes a's mtime on disk
+    cache.put('c', bytes(100))
+    names = sorted(os.path.basename(path) for path, _, _ in cache.entries())
+    assert names == ['a.frame', 'c.frame']
+
+def test_prune_and_stats(tmp_path):
+    cache = main.FrameCache(str(tmp_path), max_bytes=1000)
+    for i, key in enumerate('abc'):
+        cache.put(key, bytes(100))
+        age(cache, key, 30 - i)
+    (tmp_path / 'ignored.tmp').write_bytes(bytes(50))
+    assert cache.stats() == {'directory': str(tmp_path), 'entries': 3, 'bytes': 300, 'max_bytes': 1000}
+    assert cache.prune(150) == (2, 200)
+    assert [os.path.basename(path) for path, _, _ in cache.entries()] == ['c.frame']
+    assert cache.prune(150) == (0, 0)
+    assert main.FrameCache(str(tmp_path / 'missing')).stats()['entries'] == 0
+
+def test_read_only_cache_still_hits(tmp_path, monkeypatch):
+    main.FrameCache(str(tmp_path)).put('a', b'frame')
+
+    def utime(*args, **kwargs):
+        raise PermissionError('read-only file system')
+
+    monkeypatch.setattr(main.os, 'utime', utime)
+    assert main.FrameCache(str(tmp_path)).get('a') == b'frame'
@@ -0,0 +1,47 @@
+import numpy as np
+import pytest
+from PIL import Image
+
+import main
+
+def reference_bw_data(image):
+    """The original getpixel loop for black/white planes."""
+    byte_width = (image.width + 7) // 8
+    buffer = bytearray(byte_width * image.height)
+    for y in range(image.height):
+        for x in range(image.width):
+            r, _, _ = image.getpixel((x, y))
+            if r > 128: buffer[y * byte_width + x // 8] |= (1 << (7 - (x % 8)))
+    return bytes(buffer)
+
+def reference_bwr_data(image):
+    """The original getpixel loop for black/white/red planes."""
+    width, height = image.width, image.height
+    byte_width = (width + 7) // 8
+    b_buffer = bytearray(height * byte_width)
+    r_buffer = bytearray(height * byte_width)
+    for y in range(height):
+        for x in range(width):
+            r, g, b = image.getpixel((x, y))
+            byte_index = y * byte_width + x // 8
+            bit_index = 7 - (x % 8)
+            if r < 128 and g < 128 and b < 128: # Black
+                r_buffer[byte_index] |= (1 << bit_index)
+            elif r > 128 and g > 128 and b > 128: # White
+                b_buffer[byte_index] |= (1 << bit_index)
+                r_buffer[byte_index] |= (1 << bit_index)
+            else: # Red
+                b_buffer[byte_index] |= (1 << bit_index)
+    return bytes(b_buffer) + bytes(r_buffer)
+
+def boundary_image(width, height):
+    """Channels drawn from values around the 128 threshold, plus the extremes."""
+    rng = np.random.default_rng(width * 1000 + height)
+    values = np.array([0, 127, 128, 129, 255], dtype=np.uint8)
+    return Image.fromarray(values[rng.integers(0, len(values), (height, width, 3))])
+
+@pytest.mark.parametrize('resolution', sorted(set(main.DRIVER_TO_RESOLUTION.values())), ids=lambda r: f"{r[0]}x{r[1]}")
+def test_packing_matches_reference(resolution):
+    image = boundary_image(*resolution)
+    assert main.image_to_bw_data(image) == reference_bw_data(image)
+    assert main.image_to_bwr_data(image) == reference_bwr_data(image)
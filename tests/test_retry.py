@@ -0,0 +1,86 @@
+import asyncio
+import functools
+
+import pytest
+
+import main
+
+real_sleep = asyncio.sleep
+
+async def fast_sleep(delay, *args):
+    await real_sleep(0)
+
+@pytest.mark.parametrize('bound', ['low', 'high'])
+def test_backoff_doubles_up_to_cap_with_equal_jitter(monkeypatch, bound):
+    monkeypatch.setattr(main.random, 'uniform', lambda a, b: a if bound == 'low' else b)
+    delays = [main.backoff_delay(i, base=2, cap=60) for i in range(8)]
+    full = [2, 4, 8, 16, 32, 60, 60, 60]
+    assert delays == [d / 2 if bound == 'low' else d for d in full]
+
+def test_backoff_stays_within_bounds():
+    for i in range(20):
+        delay = min(60, 2 * 2 ** i)
+        assert delay / 2 <= main.backoff_delay(i, base=2, cap=60) <= delay
+
+class Device:
+    """A simulated display whose link drops on the drop_at-th image chunk."""
+
+    def __init__(self, monkeypatch, tmp_path, drop_at=None, forget_on_reconnect=False):
+        self.clients = []
+        self.chunks = 0
+        self.drop_at = drop_at
+        self.forget_on_reconnect = forget_on_reconnect
+        device = self
+
+        class Client(main.SimulatedClient):
+            def __init__(self, *args, **kwargs):
+                super().__init__(*args, **kwargs)
+                device.clients.append(self)
+
+            async def connect(self, **kwargs):
+                if device.forget_on_reconnect and len(device.clients) > 1: # Power-cycled while away
+                    self.planes.clear()
+                await super().connect(**kwargs)
+
+            async def write_gatt_char(self, char_specifier, data, response=False):
+                if data[0] == main.EpdCmd.WRITE_IMG:
+                    device.chunks += 1
+                    if device.chunks == device.drop_at:
+                        await self.disconnect()
+                        raise EOFError("Simulated disconnect")
+                await super().write_gatt_char(char_specifier, data, response)
+
+        monkeypatch.setattr(main, 'CACHE_DIR', str(tmp_path))
+        monkeypatch.setattr(main.SimulatedClient, 'memory', {})
+        monkeypatch.setattr(main.DeviceSession, 'client_class', functools.partial(Client, driver=0x04))
+        monkeypatch.setattr(asyncio, 'sleep', fast_sleep)
+        self.image = tmp_path / 'image.png'
+        main.Image.linear_gradient('L').resize((800, 480)).convert('RGB').save(self.image)
+
+    def send(self, **kwargs):
+        metrics = main.RunMetrics('AA:01')
+        main.current_metrics.set(metrics)
+        ok = asyncio.run(main.main_logic('AA:01', None, image_path=str(self.image), width=800, height=480,
+                                         color_mode='bwr', retry=2, retry_delay=0, use_cache=False, **kwargs))
+        expected = main.render_frame(str(self.image), None, 800, 480, color_mode='bwr')
+        return ok, self.clients[-1].displayed == tuple(expected), metrics.counters
+
+def test_resume_continues_from_last_acknowledged_chunk(monkeypatch, tmp_path):
+    device = Device(monkeypatch, tmp_path, drop_at=300) # In the red plane
+    ok, displayed, counters = device.send(resume=True)
+    assert ok and displayed
+    assert counters['resumes'] == 1
+    assert counters['bytes'] < 96000 # The bw plane once, then only the rest of the red plane
+
+def test_without_resume_the_whole_frame_is_sent_again(monkeypatch, tmp_path):
+    device = Device(monkeypatch, tmp_path, drop_at=300)
+    ok, displayed, counters = device.send()
+    assert ok and displayed
+    assert 'resumes' not in counters
+    assert counters['bytes'] == 96000 + 48000 # The bw plane of the first attempt, then the whole frame
+
+def test_rejected_resume_falls_back_to_whole_frame(monkeypatch, tmp_path):
+    device = Device(monkeypatch, tmp_path, drop_at=100, forget_on_reconnect=True)
+    ok, displayed, counters = device.send(resume=True)
+    assert ok and displayed
+    assert counters['resumes'] == 1 and counters['resumes_rejected'] == 1
@@ -0,0 +1,45 @@
+import asyncio
+import functools
+
+import pytest
+
+import main
+
+real_sleep = asyncio.sleep
+
+async def write_then_init():
+    client = main.SimulatedClient('AA:BB:CC:DD:EE:FF')
+    await client.connect()
+    await main.write_image_data(client, bytes(range(200)), 23, 4, step='bw')
+    assert client.received_planes() == (bytes(range(200)),)
+    await main.send_command(client, main.EpdCmd.INIT)
+    return client.received_planes()
+
+def test_init_discards_received_planes():
+    assert asyncio.run(write_then_init()) == ()
+
+@pytest.mark.parametrize('driver', sorted(main.DRIVER_TO_RESOLUTION))
+@pytest.mark.parametrize('color_mode', ['bw', 'bwr'])
+def test_send_displays_the_rendered_frame(monkeypatch, tmp_path, driver, color_mode):
+    clients = []
+
+    class Client(main.SimulatedClient):
+        def __init__(self, *args, **kwargs):
+            super().__init__(*args, **kwargs)
+            clients.append(self)
+
+    async def fast_sleep(delay, *args):
+        await real_sleep(0)
+
+    monkeypatch.setattr(main, 'CACHE_DIR', str(tmp_path))
+    monkeypatch.setattr(main.SimulatedClient, 'memory', {})
+    monkeypatch.setattr(main.DeviceSession, 'client_class', functools.partial(Client, driver=driver, latency=0.0075))
+    monkeypatch.setattr(asyncio, 'sleep', fast_sleep)
+    image = tmp_path / 'image.png'
+    main.Image.radial_gradient('L').resize((640, 480)).convert('RGB').save(image)
+
+    # The resolution comes from the simulated device's config notification.
+    assert asyncio.run(main.main_logic('AA:01', None, image_path=str(image), color_mode=color_mode, use_cache=False))
+    width, height = main.DRIVER_TO_RESOLUTION[driver]
+    assert clients[-1].displayed == main.render_frame(str(image), None, width, height, color_mode=color_mode)
+    assert clients[-1].stats['refreshes'] == 1
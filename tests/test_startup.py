@@ -0,0 +1,15 @@
+import os
+import subprocess
+import sys
+
+import pytest
+
+import main
+
+@pytest.mark.parametrize('args', main.STARTUP_COMMANDS)
+def test_lightweight_commands_skip_heavy_imports(tmp_path, args):
+    env = dict(os.environ, XDG_CACHE_HOME=str(tmp_path))
+    result = subprocess.run([sys.executable, '-X', 'importtime', main.__file__, *args],
+                            capture_output=True, text=True, check=True, env=env)
+    imported = {line.rsplit('|', 1)[-1].strip() for line in result.stderr.splitlines() if line.startswith('import time:')}
+    assert imported & set(main.HEAVY_MODULES) == set()
@@ -0,0 +1,65 @@
+import asyncio
+
+import numpy as np
+import pytest
+from PIL import Image
+
+import main
+
+def make_image(width, height):
+    rng = np.random.default_rng(width * 1000 + height)
+    return Image.fromarray(rng.integers(0, 256, (height, width, 3), dtype=np.uint8))
+
+@pytest.mark.parametrize('color_mode', ['bw', 'bwr'])
+@pytest.mark.parametrize('algorithm', ['floyd', 'jarvis', 'stucki', 'atkinson', 'bayer4', 'bluenoise', 'none'])
+def test_streamed_bands_match_whole_image(algorithm, color_mode):
+    image = make_image(61, 83) # Several bands, the last one partial
+    bands = []
+    result = main.prepare_image(image, None, 61, 83, None, None, None, None, color_mode, algorithm,
+                                on_rows=lambda rows: bands.append(main.pixels_to_planes(rows, color_mode)))
+    if algorithm in ('floyd', 'jarvis', 'stucki', 'atkinson'):
+        assert len(bands) > 1
+    streamed = tuple(b''.join(band) for band in zip(*bands))
+    assert streamed == main.image_to_planes(result, color_mode)
+
+def test_render_frame_returns_streamed_planes(tmp_path):
+    path = str(tmp_path / 'image.png')
+    make_image(61, 83).save(path)
+    bands = []
+    planes = main.render_frame(path, None, 61, 83, color_mode='bwr', dither_algo='floyd', on_planes=bands.append)
+    assert planes == tuple(b''.join(band) for band in zip(*bands))
+    assert planes == main.render_frame(path, None, 61, 83, color_mode='bwr', dither_algo='floyd')
+
+def test_plane_stream_raises_worker_error():
+    async def run():
+        stream = main.PlaneStream(100)
+        stream.feed(bytes(10))
+        await stream.wait_for(10)
+        waiting = asyncio.ensure_future(stream.wait_for(50))
+        await asyncio.sleep(0)
+        stream.fail(ValueError("render failed"))
+        await waiting
+
+    with pytest.raises(ValueError, match="render failed"):
+        asyncio.run(run())
+
+def test_start_render_streams_planes_and_propagates_errors(tmp_path):
+    path, junk = str(tmp_path / 'image.png'), tmp_path / 'junk.png'
+    make_image(40, 40).save(path)
+    junk.write_bytes(b'not an image')
+
+    async def run(image_path):
+        streams, task = main.start_render(image_path, None, 40, 40, color_mode='bwr', dither_algo='floyd')
+        try:
+            for stream in streams:
+                await stream.wait_for(len(stream))
+        except OSError:
+            await asyncio.wait([task])
+            assert task.exception() is not None # Retrieved, so asyncio has nothing to warn about
+            raise
+        return tuple(bytes(stream.data) for stream in streams), await task
+
+    streamed, planes = asyncio.run(run(path))
+    assert streamed == planes
+    with pytest.raises(OSError):
+        asyncio.run(run(str(junk)))
@@ -0,0 +1,42 @@
+import pytest
+from PIL import Image, ImageDraw
+
+import main
+
+MARKUP = "[size=40,align=center]{time}\\n[size=20,color=red]Price: {price}\\n[align=right]{note}"
+FIELDS = [
+    {'time': '12:00', 'price': '1.99', 'note': 'a'},
+    {'time': '12:01', 'price': '1.99', 'note': 'a'},
+    {'time': 'Ágy', 'price': '1.99', 'note': 'a'}, # Taller first line moves the lines below
+    {'time': '12:01', 'price': '23.50', 'note': 'jump'},
+]
+
+def reference_image(template, width, height, fields):
+    """Each line drawn straight with ImageDraw.text, as before lines were cached."""
+    image = Image.new('RGB', (width, height), template.background)
+    draw = ImageDraw.Draw(image)
+    for (x_text, y_text, text, _, _), (_, font, fill, _) in zip(template.layout(width, fields), template.lines):
+        draw.text((x_text, y_text), text, font=font, fill=fill)
+    return image
+
+@pytest.mark.parametrize('color_mode', ['bw', 'bwr'])
+@pytest.mark.parametrize('algorithm', ['none', 'bayer', 'floyd', 'bluenoise'])
+def test_incremental_render_matches_full_render(tmp_path, monkeypatch, algorithm, color_mode):
+    monkeypatch.setattr(main, 'CACHE_DIR', str(tmp_path))
+    template = main.TextTemplate(MARKUP, main.DEFAULT_FONT, 24, 'black', 'white')
+    for fields in FIELDS:
+        planes = template.render_planes(250, 122, fields, color_mode, algorithm)
+        full = main.render_frame(None, MARKUP.format_map(fields), 250, 122, main.DEFAULT_FONT, 24, 'black', 'white',
+                                 color_mode, algorithm)
+        assert planes == full, fields
+
+@pytest.mark.parametrize('markup', [
+    "[size=33,align=center]{x}\\n[size=17,align=right]{x}",
+    "[size=90,align=center]{x}{x}{x}{x}", # Wider than the canvas, so it starts left of it
+])
+@pytest.mark.parametrize('value', ['1', '12:01', 'WWj'])
+def test_cached_lines_match_draw_text(markup, value):
+    template = main.TextTemplate(markup, main.DEFAULT_FONT, 24, 'black', 'white')
+    for width in (250, 251):
+        fields = {'x': value}
+        assert template.render_image(width, 122, fields).tobytes() == reference_image(template, width, 122, fields).tobytes()